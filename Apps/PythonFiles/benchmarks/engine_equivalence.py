@@ -0,0 +1,110 @@
+"""
+Statistical equivalence between the GameEngine and the VectorGameEngine
+
+Plays the same scenarios with both engines, then compares the win ratios (two-proportion z-test)
+and the mean amounts of days (Welch z-test).
+The GameEngine uses batched decisions, as the players of the VectorGameEngine choose from the dawn state.
+
+Run from PythonFiles/ with
+>>> python -m benchmarks.engine_equivalence
+Exits with an error code when a difference is significant.
+"""
+
+import argparse
+import math
+import sys
+from statistics import NormalDist, mean, variance
+from typing import Dict, List
+
+from src.game_engine import GameEngine, GameEngineParams
+from src.vector_engine import VectorGameEngine
+
+SCENARIOS: Dict[str, Dict] = {
+    "default": {},
+    "scarce_resources": {
+        "initial_water_level": 80,
+        "initial_food_amount": 80,
+        "wreck_probability": 0.3,
+    },
+    "crowded_wreck": {
+        "number_of_players": 40,
+        "bucket_amount": 5,
+        "axe_amount": 5,
+        "fishing_rod_amount": 5,
+        "initial_water_level": 300,
+        "initial_food_amount": 300,
+    },
+}
+
+
+def _p_value(z: float) -> float:
+    return 2 * (1 - NormalDist().cdf(abs(z)))
+
+
+def _compare_ratios(a: List[bool], b: List[bool]) -> float:
+    pooled = (sum(a) + sum(b)) / (len(a) + len(b))
+    deviation = math.sqrt(pooled * (1 - pooled) * (1 / len(a) + 1 / len(b)))
+    if deviation == 0:
+        return 1.0
+    return _p_value((sum(a) / len(a) - sum(b) / len(b)) / deviation)
+
+
+def _compare_means(a: List[float], b: List[float]) -> float:
+    deviation = math.sqrt(variance(a) / len(a) + variance(b) / len(b))
+    if deviation == 0:
+        return 1.0 if mean(a) == mean(b) else 0.0
+    return _p_value((mean(a) - mean(b)) / deviation)
+
+
+def compare(params: GameEngineParams, amount_of_games: int) -> Dict[str, float]:
+    """Plays the games with both engines and returns the statistics"""
+    object_wins, object_days = [], []
+    for _ in range(amount_of_games):
+        ge = GameEngine(params)
+        while ge.run_single() is not None:
+            ...
+        object_wins.append(ge.colony.at_least_one_left_the_isle)
+        object_days.append(ge.current_day)
+
+    vge = VectorGameEngine(params, amount_of_games)
+    vge.run()
+    vector_wins, vector_days = vge.wins.tolist(), vge.days.tolist()
+
+    return {
+        "object_win_ratio": mean(object_wins),
+        "vector_win_ratio": mean(vector_wins),
+        "win_ratio_p_value": _compare_ratios(object_wins, vector_wins),
+        "object_mean_days": mean(object_days),
+        "vector_mean_days": mean(vector_days),
+        "mean_days_p_value": _compare_means(object_days, vector_days),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--games", type=int, default=300)
+    parser.add_argument("--alpha", type=float, default=0.001)
+    args = parser.parse_args()
+
+    failures = 0
+    for name, scenario in SCENARIOS.items():
+        params = GameEngineParams(batch_decisions=True, **scenario)
+        result = compare(params, args.games)
+        equivalent = (
+            result["win_ratio_p_value"] >= args.alpha
+            and result["mean_days_p_value"] >= args.alpha
+        )
+        failures += not equivalent
+        print(
+            f"{'✔️' if equivalent else '❌'} {name} : "
+            f"wins {result['object_win_ratio']:.3f} / {result['vector_win_ratio']:.3f} "
+            f"(p={result['win_ratio_p_value']:.3f}), "
+            f"days {result['object_mean_days']:.2f} / {result['vector_mean_days']:.2f} "
+            f"(p={result['mean_days_p_value']:.3f})"
+        )
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+Latency of a decision of the brain
+
+Compares the eager Q-Network under torch.no_grad, the frozen TorchScript network under torch.inference_mode
+and the NumPy network the games are played with,
+for a single player and for a whole colony at once, with the given amounts of torch threads.
+
+Run from PythonFiles/ with
+>>> python -m benchmarks.inference_latency
+"""
+
+import argparse
+import time
+from typing import Callable, List
+import numpy as np
+import torch
+
+from src.brain import _NumpyQNetwork, amount_of_inputs, amount_of_outputs
+from src.q_network import _QNetwork, freeze
+
+
+def _latency(decide: Callable, inputs: np.ndarray, repeats: int) -> float:
+    """Returns the median time of a call, in microseconds"""
+    for _ in range(repeats // 10):
+        decide(inputs)
+
+    times: List[float] = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        decide(inputs)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--repeats", type=int, default=20_000)
+    parser.add_argument("--players", type=int, default=22)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4])
+    args = parser.parse_args()
+
+    q_network = _QNetwork(input_size=amount_of_inputs, output_size=amount_of_outputs)
+    q_network.eval()
+    frozen = freeze(q_network)
+    numpy_network = _NumpyQNetwork(
+        {name: tensor.numpy() for name, tensor in q_network.state_dict().items()}
+    )
+
+    def eager(inputs: np.ndarray):
+        with torch.no_grad():
+            return q_network(torch.from_numpy(inputs)).argmax(dim=-1).tolist()
+
+    def optimized(inputs: np.ndarray):
+        with torch.inference_mode():
+            return frozen(torch.from_numpy(inputs)).argmax(dim=-1).tolist()
+
+    def numpy(inputs: np.ndarray):
+        return np.argmax(numpy_network(inputs), axis=-1).tolist()
+
+    rng = np.random.default_rng(0)
+    row = rng.random(amount_of_inputs, dtype=np.float32)
+    colony = rng.random((args.players, amount_of_inputs), dtype=np.float32)
+
+    for threads in args.threads:
+        torch.set_num_threads(threads)
+        for name, inputs in [("single", row), (f"colony of {args.players}", colony)]:
+            eager_time = _latency(eager, inputs, args.repeats)
+            optimized_time = _latency(optimized, inputs, args.repeats)
+            numpy_time = _latency(numpy, inputs, args.repeats)
+            print(
+                f"{threads} thread(s), {name} : "
+                f"eager {eager_time:.1f}µs, frozen {optimized_time:.1f}µs "
+                f"(x{eager_time / optimized_time:.2f}), "
+                f"numpy {numpy_time:.1f}µs (x{eager_time / numpy_time:.2f})"
+            )
+
+
+if __name__ == "__main__":
+    main()
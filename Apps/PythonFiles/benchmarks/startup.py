@@ -0,0 +1,168 @@
+"""
+Startup time and memory of the API
+
+Each endpoint is measured in a fresh interpreter : time to import src.api, resident memory once imported,
+then time and resident memory after a first call, together with the heavy modules this call loaded.
+Only /train is allowed to import torch, the other endpoints playing the games with NumPy.
+Importing src.api is not allowed to import any of the heavy modules, the evaluation included.
+
+Run from PythonFiles/ with
+>>> python -m benchmarks.startup
+Exits with an error code when an endpoint imports the training stack or exceeds the given budget.
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+# Modules only the trainings should import
+TRAINING_MODULES = ["torch", "src.brain_trainer", "src.q_network"]
+# Modules reported when loaded by a call
+HEAVY_MODULES = TRAINING_MODULES + ["src.evaluation", "src.vector_engine"]
+
+
+def _rss_mb() -> float:
+    """Peak resident memory of the process, ru_maxrss being in kilobytes on Linux and bytes on macOS"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == "darwin" else rss / 2**10
+
+
+def _requests(brain_location: str) -> Dict[str, Dict]:
+    return {
+        "/check-brain": {"method": "GET", "url": "/check-brain"},
+        "/run": {"method": "POST", "url": "/run", "json": {"seed": 1}},
+        "/run compact": {
+            "method": "POST",
+            "url": "/run?compact=true",
+            "json": {"seed": 1},
+        },
+        "/test": {
+            "method": "POST",
+            "url": "/test",
+            "json": {"amount_of_games": 20, "seed": 1},
+        },
+        "/train": {
+            "method": "POST",
+            "url": "/train",
+            "json": {
+                "ge_params": {"brain_location": brain_location},
+                "iter_amount": 2,
+                "warm_up": 10,
+            },
+        },
+    }
+
+
+def _measure(endpoint: str, brain_location: str) -> Dict:
+    """Runs in the fresh interpreter"""
+    start = time.perf_counter()
+    from src.api import app
+
+    import_time = time.perf_counter() - start
+    import_rss = _rss_mb()
+    loaded_before = {m for m in HEAVY_MODULES if m in sys.modules}
+
+    from fastapi.testclient import TestClient
+
+    request = _requests(brain_location)[endpoint]
+    start = time.perf_counter()
+    response = TestClient(app).request(**request)
+    response.raise_for_status()
+
+    return {
+        "endpoint": endpoint,
+        "import_time": import_time,
+        "import_rss_mb": import_rss,
+        "first_call_time": time.perf_counter() - start,
+        "first_call_rss_mb": _rss_mb(),
+        "imported_at_startup": sorted(loaded_before),
+        "imported_by_call": sorted(
+            m for m in HEAVY_MODULES if m in sys.modules and m not in loaded_before
+        ),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--max-import-time", type=float, default=None)
+    parser.add_argument("--max-import-rss", type=float, default=None)
+    parser.add_argument(
+        "--json", action="store_true", help="Prints the results as JSON"
+    )
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(_measure(*args.child)))
+        return 0
+
+    # The training overwrites its brain, a copy is trained
+    directory = tempfile.mkdtemp()
+    brain_location = os.path.join(directory, "brain.pth")
+    shutil.copy("brains/trained_q_network.pth", brain_location)
+
+    results: List[Dict] = []
+    try:
+        for endpoint in _requests(brain_location):
+            output = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.startup",
+                    "--child",
+                    endpoint,
+                    brain_location,
+                ],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+    finally:
+        shutil.rmtree(directory)
+
+    failures = []
+    for result in results:
+        endpoint = result["endpoint"]
+        training_modules = [
+            m
+            for m in result["imported_at_startup"] + result["imported_by_call"]
+            if m in TRAINING_MODULES
+        ]
+        if endpoint != "/train" and training_modules:
+            failures.append(f"{endpoint} imports {', '.join(training_modules)}")
+        if result["imported_at_startup"]:
+            failures.append(
+                f"importing src.api imports {', '.join(result['imported_at_startup'])}"
+            )
+        if args.max_import_time and result["import_time"] > args.max_import_time:
+            failures.append(f"{endpoint} imports in {result['import_time']:.2f}s")
+        if args.max_import_rss and result["import_rss_mb"] > args.max_import_rss:
+            failures.append(
+                f"{endpoint} uses {result['import_rss_mb']:.0f}MB once imported"
+            )
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            print(
+                f"{result['endpoint']:<14} import {result['import_time']:.2f}s "
+                f"{result['import_rss_mb']:.0f}MB, first call {result['first_call_time']:.2f}s "
+                f"{result['first_call_rss_mb']:.0f}MB "
+                f"[{', '.join(result['imported_by_call']) or 'nothing heavy'}]"
+            )
+    for failure in failures:
+        print(f"❌ {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
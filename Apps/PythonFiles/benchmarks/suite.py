@@ -0,0 +1,272 @@
+"""
+Benchmark suite of the hot paths
+
+Seeded scenarios measuring:
+- engine : days simulated per second by the GameEngine, for several amounts of players
+- inference : latency of Brain.chose_action and Brain.chose_actions
+- training : transitions learnt per second by BrainTrainer.train, sequential and vectorized
+- api : latency of /run and /test through an in-process test client, the results cache being emptied before each call
+- memory : bytes allocated per player of a GameEngine, with empty and full inventories
+
+Results are written as JSON, and can be compared to a baseline written by a previous run.
+
+Run from PythonFiles/ with
+>>> python -m benchmarks.suite --output baseline.json
+>>> python -m benchmarks.suite --baseline baseline.json
+Exits with an error code when a result is worse than the baseline beyond the tolerance.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from src.game_engine import GameEngine, GameEngineParams
+from src.brain import Brain, colony_vision
+
+BRAIN_LOCATION = "brains/trained_q_network.pth"
+ENGINE_PLAYERS = [5, 22, 200, 2_000]
+
+
+def _result(value: float, unit: str, higher_is_better: bool) -> Dict:
+    return {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+
+def _median_time(function: Callable, repeats: int) -> float:
+    times: List[float] = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def bench_engine(quick: bool) -> Dict[str, Dict]:
+    """Days per second, over the first days of several seeded games"""
+    results = {}
+    for players in ENGINE_PLAYERS:
+        games = 2 if quick or players >= 200 else 10
+        max_days = 5 if players >= 2_000 else 30
+
+        days, elapsed = 0, 0.0
+        for seed in range(games):
+            ge = GameEngine(
+                GameEngineParams(
+                    number_of_players=players, seed=seed, brain_location=BRAIN_LOCATION
+                )
+            )
+            start = time.perf_counter()
+            while ge.current_day < max_days and ge.run_single() is not None:
+                ...
+            elapsed += time.perf_counter() - start
+            days += ge.current_day
+
+        results[f"engine.days_per_second.players_{players}"] = _result(
+            days / elapsed, "days/s", True
+        )
+    return results
+
+
+def bench_inference(quick: bool) -> Dict[str, Dict]:
+    """Latency of the decisions, on the inputs of a seeded colony"""
+    repeats = 2_000 if quick else 20_000
+    ge = GameEngine(GameEngineParams(seed=0, brain_location=BRAIN_LOCATION))
+    inputs = colony_vision(ge.colony, ge.colony.alive_players)
+    brain = Brain(BRAIN_LOCATION)
+
+    single = _median_time(lambda: brain.chose_action(inputs[0]), repeats)
+    batch = _median_time(lambda: brain.chose_actions(inputs), repeats)
+    return {
+        "inference.chose_action": _result(single * 1e6, "µs", False),
+        f"inference.chose_actions.rows_{len(inputs)}": _result(
+            batch * 1e6, "µs", False
+        ),
+    }
+
+
+def bench_training(quick: bool) -> Dict[str, Dict]:
+    """Transitions learnt per second, on a copy of the brain"""
+    from src.brain_trainer import BrainTrainer
+
+    iterations = 5 if quick else 30
+    results = {}
+    directory = tempfile.mkdtemp()
+    try:
+        for name, options in [
+            ("sequential", {}),
+            ("vectorized", {"vectorized_games": 8}),
+        ]:
+            location = os.path.join(directory, f"{name}.pth")
+            shutil.copy(BRAIN_LOCATION, location)
+            trainer = BrainTrainer(
+                ge_params=GameEngineParams(seed=0, brain_location=location),
+                learning_rate=0.001,
+                discount_factor=0.99,
+                greedy_epsilon=0.1,
+                iter_amount=iterations,
+                max_win_streak=iterations,
+                warm_up=256,
+                **options,
+            )
+            with contextlib.redirect_stdout(io.StringIO()):
+                training_sum = trainer.train()
+            results[f"training.transitions_per_second.{name}"] = _result(
+                training_sum.transitions_per_second, "transitions/s", True
+            )
+    finally:
+        shutil.rmtree(directory)
+    return results
+
+
+def bench_api(quick: bool) -> Dict[str, Dict]:
+    """Latency of the requests, without the results cache"""
+    from fastapi.testclient import TestClient
+    from src.api import app
+    from src.result_cache import result_cache
+
+    client = TestClient(app)
+    repeats = 3 if quick else 20
+
+    def request(url: str, body: Dict):
+        result_cache.clear()
+        with contextlib.redirect_stdout(io.StringIO()):
+            client.post(url, json=body).raise_for_status()
+
+    run_body = {"seed": 1, "brain_location": BRAIN_LOCATION}
+    test_body = {
+        "ge_params": {"brain_location": BRAIN_LOCATION},
+        "amount_of_games": 50,
+        "seed": 1,
+    }
+    return {
+        "api.run": _result(
+            _median_time(lambda: request("/run", run_body), repeats) * 1e3, "ms", False
+        ),
+        "api.test.games_50": _result(
+            _median_time(lambda: request("/test", test_body), repeats) * 1e3,
+            "ms",
+            False,
+        ),
+    }
+
+
+def bench_memory(quick: bool) -> Dict[str, Dict]:
+    """Bytes allocated per player, the brain being loaded beforehand as it is shared"""
+    players = 1_000 if quick else 10_000
+    GameEngine(GameEngineParams(number_of_players=1, brain_location=BRAIN_LOCATION))
+
+    results = {}
+    for name, searches in [("empty_inventory", 0), ("full_inventory", 3)]:
+        tracemalloc.start()
+        # Every search of the wreck finds an item the player doesn't have yet
+        ge = GameEngine(
+            GameEngineParams(
+                number_of_players=players,
+                seed=0,
+                brain_location=BRAIN_LOCATION,
+                wreck_probability=1,
+                bucket_amount=players,
+                axe_amount=players,
+                fishing_rod_amount=players,
+            )
+        )
+        for player in ge.colony.alive_players:
+            for _ in range(searches):
+                player.search_wreck()
+        allocated = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        results[f"memory.bytes_per_player.{name}"] = _result(
+            allocated / players, "B", False
+        )
+    return results
+
+
+GROUPS: Dict[str, Callable[[bool], Dict[str, Dict]]] = {
+    "engine": bench_engine,
+    "inference": bench_inference,
+    "training": bench_training,
+    "api": bench_api,
+    "memory": bench_memory,
+}
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float):
+    """Prints the changes from the baseline, and returns the names of the regressions"""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"  {name} : {result['value']:.2f} {result['unit']} (new)")
+            continue
+
+        before = baseline[name]["value"]
+        change = (result["value"] - before) / before
+        worse = -change if result["higher_is_better"] else change
+        regressed = worse > tolerance
+        regressions += [name] if regressed else []
+        print(
+            f"{'❌' if regressed else '✔️'} {name} : {before:.2f} -> "
+            f"{result['value']:.2f} {result['unit']} ({change:+.1%})"
+        )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--groups", nargs="+", choices=GROUPS, default=list(GROUPS))
+    parser.add_argument(
+        "--quick", action="store_true", help="Less repetitions, less stable"
+    )
+    parser.add_argument("--output", help="Writes the results to this JSON file")
+    parser.add_argument("--baseline", help="Compares the results to this JSON file")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Relative change accepted before a result counts as a regression",
+    )
+    args = parser.parse_args()
+
+    results: Dict[str, Dict] = {}
+    for group in args.groups:
+        group_results = GROUPS[group](args.quick)
+        for name, result in group_results.items():
+            print(f"{name} : {result['value']:.2f} {result['unit']}", file=sys.stderr)
+        results.update(group_results)
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "cpus": os.cpu_count(),
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,25 +3,33 @@ This file doesn't define any action but handle their registering
 
 In order to register an action, create an instance of ActionRegistry and call it as a decorator as such:
 >>> ar = ActionRegistry()
->>> @ar(id_=1)
+>>> @ar(id_=0)
 >>> def foo():
 >>>   ...
 
+IDs are registered in order, from 0 and without gaps, they index the outputs of the neural network.
 The registered functions are accessible though the created instance as such:
 >>> print(ar.actions)
+>>> print(len(ar))
 
 To call a registered method, use
->>> ar.call_action(1, ...)
+>>> ar.call_action(0, ...)
+or, for several actions at once, each one being called with its own instance
+>>> ar.call_actions([0, 0, 1], instances)
 """
 
 from dataclasses import dataclass
-from typing import List, Callable, Any
+from typing import List, Callable, Any, Iterable
 
 
 class UnregisteredAction(Exception):
     """Raised when the action required is not the registry"""
 
 
+class InvalidActionRegistration(Exception):
+    """Raised when an action is registered with an ID already taken or leaving a gap"""
+
+
 @dataclass
 class Action:
     """Defines an action together with its ID to be registered"""
@@ -35,29 +43,48 @@ class ActionRegistry:
 
     def __init__(self):
         self.actions: List[Action] = []
+        # Functions indexed by their ID
+        self._dispatch: List[Callable] = []
 
     def __call__(self, id_: int):
         def register_function(func: Callable):
-            self.actions.append(Action(func, id_))
+            if 0 <= id_ < len(self._dispatch):
+                raise InvalidActionRegistration(
+                    f"Action #{id_} is already registered "
+                    f"as {self._dispatch[id_].__name__}"
+                )
+            if id_ != len(self._dispatch):
+                raise InvalidActionRegistration(
+                    f"Action #{id_} registered while the next ID is #{len(self._dispatch)}"
+                )
 
-            def wrapper(*args, **kwargs):
-                func(*args, **kwargs)
-
-            return wrapper
+            self.actions.append(Action(func, id_))
+            self._dispatch.append(func)
+            return func
 
         return register_function
 
+    def __len__(self) -> int:
+        return len(self._dispatch)
+
     def get_func(self, id_: int) -> Callable:
         """
         Returns the actions callable registered with the given ID
         :raises UnregisteredAction:
         """
-        for action in self.actions:
-            if action.id_ == id_:
-                return action.function
-
-        raise UnregisteredAction(f"ActionSummary #{id_} wasn't registered")
+        if not 0 <= id_ < len(self._dispatch):
+            raise UnregisteredAction(f"ActionSummary #{id_} wasn't registered")
+        return self._dispatch[id_]
 
     def call_action(self, id_: int, *args, **kwargs) -> Any:
         """Calls the action registered under the given ID"""
         return self.get_func(id_)(*args, **kwargs)
+
+    def call_actions(self, ids: Iterable[int], instances: Iterable[Any]) -> List[Any]:
+        """
+        Calls the action of each ID with the instance at the same position, in order
+        :return: The values returned by the actions
+        :raises UnregisteredAction:
+        """
+        get_func = self.get_func
+        return [get_func(id_)(instance) for id_, instance in zip(ids, instances)]
@@ -1,45 +1,302 @@
-import torch
+import asyncio
+import json
 import os
-from fastapi import FastAPI, Body
-from pydantic import FilePath
+import threading
+from contextlib import asynccontextmanager
+from typing import List, Optional, Union
+from fastapi import (
+    FastAPI,
+    Body,
+    Query,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+    HTTPException,
+)
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
+from pydantic import FilePath, ValidationError
+from starlette.concurrency import run_in_threadpool
 
-from .game_engine import GameEngine, GameEngineParams, GameSum
-from .brain_trainer import BrainTrainer
+from .brain import MissingWeights, brain_registry
+from .game_engine import GameEngine, GameEngineParams, GameSum, DaySum
+from .game_log import GameLog, GameLogEncoder, encode_game
+from .replay_store import ReplaySum, replay_store
+from .result_cache import CacheSum, result_cache
+from .jobs import JobSum, TooManyJobs, job_manager
+from .progress import ProgressCallback, TrainingSum, TestSum
+from .instrumentation import metrics_registry
 
-app = FastAPI()
+# Most processes a test can use, the bound of evaluation.max_workers
+max_workers = os.cpu_count() or 1
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Every test shares a single pool, started by the first test played by several workers.
+    # The evaluation is only imported by the tests, importing it here doesn't start the pool
+    from .evaluation import shutdown_pool
+
+    shutdown_pool()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.exception_handler(MissingWeights)
+def missing_weights(request: Request, e: MissingWeights) -> JSONResponse:
+    """The brain exists but can't be played until its weights are exported, see src.q_network"""
+    return JSONResponse(status_code=409, content={"detail": str(e)})
 
 
 @app.get("/check-brain")
 def check_brain(location: FilePath = None) -> bool:
-    """Verify the existence of brains"""
+    """Verify the existence of brains, and that their weights were exported to be played"""
 
     # Check default location
     if not location:
         location = GameEngineParams().brain_location
 
-    return os.path.isfile(location)
+    if not os.path.isfile(location):
+        return False
+    try:
+        brain_registry.get(location)
+    except MissingWeights:
+        return False
+    return True
+
+
+@app.post(
+    "/run", response_model=Union[GameSum, GameLog], response_model_exclude_none=True
+)
+def run_game(
+    ge_params: GameEngineParams = Body(GameEngineParams()),
+    compact: bool = Query(False),
+) -> Union[GameSum, GameLog]:
+    """
+    Runs the game
+    When compact, returns a GameLog where each day only holds the changes from the previous one
+    Seeded games are cached, until the brain file changes
+    """
+    key = result_cache.key("run", ge_params)
+    game = result_cache.get(key, GameSum)
+    if game is None:
+        game = GameEngine(ge_params).run()
+        result_cache.put(key, game)
+    if compact:
+        return encode_game(game)
+    return game
+
+
+@app.post("/run/stream")
+def run_game_stream(
+    ge_params: GameEngineParams = Body(GameEngineParams()),
+    compact: bool = Query(False),
+) -> StreamingResponse:
+    """
+    Runs the game and streams it as newline-delimited JSON
+    The first line is the initial GameStateSum, then each line is a DaySum sent as soon as the day is simulated
+    When compact, days are sent as the DayDelta of a GameLog
+    """
+    ge = GameEngine(ge_params)
+
+    def lines():
+        stream = ge.stream()
+        initial_state = next(stream)
+        yield initial_state.model_dump_json() + "\n"
+
+        encoder = GameLogEncoder(initial_state)
+        for day in stream:
+            if compact:
+                yield encoder.encode(day).model_dump_json(exclude_none=True) + "\n"
+            else:
+                yield day.model_dump_json() + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.websocket("/run/ws")
+async def run_game_websocket(websocket: WebSocket):
+    """
+    Same as /run/stream over a WebSocket
+    The client sends the GameEngineParams, then receives the initial GameStateSum and each DaySum as text messages.
+    The server closes the connection once the game is over, with the code :
+    - 1008 when the parameters are invalid, 1003 when they aren't JSON
+    - 1011 when the game failed
+    The game stops as soon as the client disconnects
+    """
+    await websocket.accept()
+    try:
+        ge_params = GameEngineParams.model_validate(await websocket.receive_json())
+    except WebSocketDisconnect:
+        return
+    except ValidationError as e:
+        await websocket.close(code=1008, reason=str(e)[:120])
+        return
+    except (ValueError, KeyError):
+        # Not JSON, or a binary message
+        await websocket.close(code=1003, reason="Expected GameEngineParams as JSON")
+        return
+
+    try:
+        # The simulation runs in the threadpool, as in the other endpoints
+        try:
+            ge = await run_in_threadpool(GameEngine, ge_params)
+        except Exception as e:
+            await websocket.close(code=1011, reason=str(e)[:120])
+            return
+        await websocket.send_text(ge.summarize_state().model_dump_json())
+
+        while True:
+            try:
+                day = await run_in_threadpool(ge.run_single)
+            except Exception as e:
+                await websocket.close(code=1011, reason=str(e)[:120])
+                return
+            if day is None:
+                break
+            await websocket.send_text(day.model_dump_json())
+    except (WebSocketDisconnect, OSError):
+        # The client left, the game isn't played any further
+        return
 
+    await websocket.close()
 
-@app.post("/run")
-def run_game(ge_params: GameEngineParams = Body(GameEngineParams())) -> GameSum:
-    """Runs the game"""
-    return GameEngine(ge_params).run()
+
+@app.post("/replays")
+def record_replay(ge_params: GameEngineParams = Body(GameEngineParams())) -> ReplaySum:
+    """
+    Runs the game and stores it as its parameters, seed and brain hash only
+    A seed is drawn when none is given. The game can then be replayed from its ID
+    """
+    try:
+        return replay_store.record(ge_params)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@app.get("/replays")
+def list_replays() -> List[str]:
+    return replay_store.game_ids()
+
+
+@app.get(
+    "/replays/{game_id}",
+    response_model=Union[GameSum, GameLog],
+    response_model_exclude_none=True,
+)
+def replay_game(game_id: str, compact: bool = Query(False)) -> Union[GameSum, GameLog]:
+    """
+    Plays the stored game again, as /run would have returned it
+    Fails with 409 if the engine or the brain changed since the game was played
+    """
+    try:
+        game = replay_store.game(game_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown game {game_id}")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if compact:
+        return encode_game(game)
+    return game
+
+
+@app.get("/replays/{game_id}/days/{day}")
+def replay_day(game_id: str, day: int) -> DaySum:
+    """Returns a single day of the stored game, the days before not being summarized"""
+    try:
+        return replay_store.day(game_id, day)
+    except (KeyError, IndexError):
+        raise HTTPException(status_code=404, detail=f"Unknown day #{day} of {game_id}")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
 
 @app.post("/test")
 def test(
     ge_params: GameEngineParams = Body(GameEngineParams()),
     amount_of_games: int = Body(100),
-) -> float:
-    """Returns the win ratio"""
-    wins = 0
-    for _ in range(amount_of_games):
-        ge = GameEngine(ge_params)
-        ge.run()
+    vectorized: bool = Body(False),
+    workers: int = Body(1, ge=1, le=max_workers),
+    seed: Optional[int] = Body(None),
+    target_interval_width: Optional[float] = Body(None, gt=0),
+    confidence: float = Body(0.95, gt=0, lt=1),
+    background: bool = Query(False),
+) -> Union[TestSum, JobSum]:
+    """
+    Returns the win ratio, together with the statistics of the games
+    When vectorized, the games are played in lockstep by the VectorGameEngine
+    The games are shared between the given amount of worker processes, at most as many as cores.
+    Each game has its own seed, the results don't depend on the amount of workers
+    When a target width is given, the games stop as soon as the confidence interval of the win ratio is narrower,
+    amount_of_games being the maximum amount of games
+    Results are cached when seeded, until the brain file changes
+    When background, returns the submitted job right away, see /jobs
+    """
+    options = dict(
+        amount_of_games=amount_of_games,
+        workers=workers,
+        seed=seed,
+        vectorized=vectorized,
+        target_interval_width=target_interval_width,
+        confidence=confidence,
+    )
+
+    def run_test(
+        progress: Optional[ProgressCallback] = None,
+        stop: Optional[threading.Event] = None,
+    ) -> TestSum:
+        # The evaluation and its process pool are only imported by the tests
+        from .evaluation import evaluate
+
+        key = result_cache.key("test", ge_params, **options)
+        test_sum = result_cache.get(key, TestSum)
+        if test_sum is None:
+            test_sum = evaluate(ge_params, **options, progress=progress, stop=stop)
+            # The games of a cancelled test aren't all played
+            if stop is None or not stop.is_set():
+                result_cache.put(key, test_sum)
+        return test_sum
+
+    if background:
+        return _submit("test", run_test)
+    return run_test()
+
+
+@app.get("/cache")
+def cache_statistics() -> CacheSum:
+    """Hits and misses of the results cache, to size it"""
+    return result_cache.summarize()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> str:
+    """
+    Counters in the Prometheus text format :
+    the measures of the instrumented games, see GameEngineParams.instrument, and the results cache
+    """
+    cache = result_cache.summarize()
+    lines = metrics_registry.exposition()
+    lines += [
+        "# HELP tcalamer_cache_requests_total Lookups in the results cache",
+        "# TYPE tcalamer_cache_requests_total counter",
+        f'tcalamer_cache_requests_total{{result="memory_hit"}} {cache.memory_hits}',
+        f'tcalamer_cache_requests_total{{result="disk_hit"}} {cache.disk_hits}',
+        f'tcalamer_cache_requests_total{{result="miss"}} {cache.misses}',
+        "# HELP tcalamer_cache_size Results kept in memory by the results cache",
+        "# TYPE tcalamer_cache_size gauge",
+        f"tcalamer_cache_size {cache.size}",
+    ]
+    return PlainTextResponse(
+        "\n".join(lines) + "\n", media_type="text/plain; version=0.0.4"
+    )
+
 
-        if ge.colony.at_least_one_left_the_isle:
-            wins += 1
-    return wins / amount_of_games
+@app.delete("/cache")
+def clear_cache() -> CacheSum:
+    """Empties the results kept in memory, then returns the statistics"""
+    result_cache.clear()
+    return result_cache.summarize()
 
 
 @app.post("/train")
@@ -50,13 +307,37 @@ def train_brain(
     greedy_epsilon: float = Body(0.1),
     iter_amount: int = Body(500),
     max_win_streak: int = Body(50),
-) -> FilePath:
+    vectorized_games: int = Body(0),
+    replay_capacity: int = Body(50_000),
+    batch_size: int = Body(256),
+    update_frequency: int = Body(4),
+    warm_up: int = Body(1_000),
+    workers: int = Body(0),
+    sync_interval: int = Body(50),
+    checkpoint_interval: int = Body(0),
+    resume: bool = Body(False),
+    warm_start: Optional[FilePath] = Body(None),
+    background: bool = Query(False),
+) -> Union[TrainingSum, JobSum]:
     """
     Trains a single brain with the given parameters
     The file is then saved at the given location and can be used in-game
-    :return: path of the saved brain, same as the one given in parameters
+    When workers are given, the games are played by as many processes while the brain learns,
+    the workers receiving the new weights every sync_interval updates
+    A checkpoint is saved next to the brain every checkpoint_interval iterations, resume restarts from it.
+    warm_start starts the training from an existing brain instead of a random one
+    When background, returns the submitted job right away, see /jobs. A cancelled training doesn't save the brain
+    :return: path of the saved brain, same as the one given in parameters, and the training statistics
     """
+    # Torch is only imported by the trainings, the games being played with NumPy
+    from .brain_trainer import BrainTrainer, checkpoint_location
+    from .q_network import save_brain
+
     location = ge_params.brain_location
+    if resume and not os.path.exists(checkpoint_location(location)):
+        raise HTTPException(
+            status_code=404, detail=f"No checkpoint to resume from next to {location}"
+        )
 
     brain_trainer = BrainTrainer(
         ge_params=ge_params,
@@ -65,8 +346,92 @@ def train_brain(
         greedy_epsilon=greedy_epsilon,
         iter_amount=iter_amount,
         max_win_streak=max_win_streak,
+        vectorized_games=vectorized_games,
+        replay_capacity=replay_capacity,
+        batch_size=batch_size,
+        update_frequency=update_frequency,
+        warm_up=warm_up,
+        workers=workers,
+        sync_interval=sync_interval,
+        checkpoint_interval=checkpoint_interval,
+        resume=resume,
+        warm_start=warm_start,
     )
-    brain_trainer.train()
-    torch.save(brain_trainer.q_net_dict, location)
 
-    return location
+    def run_training(
+        progress: Optional[ProgressCallback] = None,
+        stop: Optional[threading.Event] = None,
+    ) -> TrainingSum:
+        training_sum = brain_trainer.train(progress, stop)
+        if stop is None or not stop.is_set():
+            save_brain(brain_trainer.q_net_dict, location)
+        return training_sum
+
+    if background:
+        return _submit("train", run_training)
+    return run_training()
+
+
+def _submit(kind: str, function) -> JobSum:
+    try:
+        return job_manager.submit(kind, function)
+    except TooManyJobs as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+
+@app.get("/jobs")
+def list_jobs() -> List[JobSum]:
+    return job_manager.jobs()
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str) -> JobSum:
+    """Returns the status of the job, its last progress, then its result once done"""
+    try:
+        return job_manager.get(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+
+
+@app.get("/jobs/{job_id}/progress")
+async def stream_job_progress(
+    job_id: str, request: Request, interval: float = Query(1.0, ge=0.1)
+) -> StreamingResponse:
+    """
+    Streams the job as newline-delimited JSON, a JobSum each time its progress changes
+    The last line is the finished job, the stream also stops when the client disconnects
+    A job forgotten in the meantime, the finished ones only being kept in a limited history,
+    ends the stream with the same detail as a 404
+    The job is polled every interval seconds, without holding a thread
+    """
+    try:
+        job_manager.get(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+
+    async def lines():
+        last = None
+        while not await request.is_disconnected():
+            try:
+                job = job_manager.get(job_id)
+            except KeyError:
+                yield json.dumps({"detail": f"Unknown job {job_id}"}) + "\n"
+                return
+            line = job.model_dump_json() + "\n"
+            if line != last:
+                yield line
+                last = line
+            if job.finished:
+                return
+            await asyncio.sleep(interval)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str) -> JobSum:
+    """A waiting job is cancelled right away, a running one stops at the end of its current iteration"""
+    try:
+        return job_manager.cancel(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
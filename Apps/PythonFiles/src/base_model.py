@@ -7,5 +7,7 @@ T = TypeVar("T", bound=PBaseModel)
 class BaseModel:
     """Represent the base model for every class of the game"""
 
+    __slots__ = ()
+
     def summarize(self) -> T:
         raise NotImplementedError()
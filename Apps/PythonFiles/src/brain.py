@@ -1,24 +1,47 @@
+import hashlib
 import os
+import random
+import threading
 from dataclasses import dataclass
-from typing import List
-import torch
-from torch import nn
+from typing import Callable, List, Dict, Tuple, Optional
+import numpy as np
 import math
 
 from .world import Weather
 
 """
-When modifying the amount of inputs or outputs, 
+When modifying the amount of inputs, 
 remember to update this variable :
 """
 amount_of_inputs = 14
-# len(_daily_actions.actions) can't be imported due to circular imports ...
-amount_of_outputs = 4
+hidden_size = 28
+
+
+def _amount_of_outputs() -> int:
+    """One output per daily action, registered by the players which import this module"""
+    from .player import _daily_actions
+
+    return len(_daily_actions)
+
+
+def __getattr__(name: str):
+    # amount_of_outputs is read once the players are imported, see _amount_of_outputs
+    if name == "amount_of_outputs":
+        return _amount_of_outputs()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Brains are played with NumPy, torch is then not needed by the games.
+# BRAIN_BACKEND=torch plays them with the frozen torch network instead
+brain_backend = os.environ.get("BRAIN_BACKEND", "numpy")
 
 
 @dataclass
 class NNInputs:
-    """Modelization of the inputs for the neural network"""
+    """
+    Modelization of the inputs for the neural network
+    The game relies on colony_vision to build the inputs, this class is kept for debugging and printing
+    """
 
     weather: Weather
 
@@ -48,15 +71,13 @@ class NNInputs:
         def distance(needs: int, objective: int) -> float:
             return 1 - math.exp(-4 * _clamp(needs / objective, 0, 1))
 
-        colony_axes = len(
-            [p for p in colony.alive_players if p.has_axe and p is not player]
-        ) / len(colony.alive_players)
-        colony_buckets = len(
-            [p for p in colony.alive_players if p.has_bucket and p is not player]
-        ) / len(colony.alive_players)
-        colony_fishing_rods = len(
-            [p for p in colony.alive_players if p.has_fishing_rod and p is not player]
-        ) / len(colony.alive_players)
+        # Share of the other alive players holding each tool
+        alive = colony.amount_of_alive_players
+        colony_axes = (colony.axe_holders - player.has_axe) / alive
+        colony_buckets = (colony.bucket_holders - player.has_bucket) / alive
+        colony_fishing_rods = (
+            colony.fishing_rod_holders - player.has_fishing_rod
+        ) / alive
 
         return cls(
             weather=world.weather,
@@ -72,6 +93,23 @@ class NNInputs:
             colony_fishing_rods=colony_fishing_rods,
         )
 
+    @classmethod
+    def from_vector(cls, vector: np.ndarray):
+        """Reads a row built by colony_vision"""
+        return cls(
+            weather=Weather(int(np.argmax(vector[0:4]))),
+            food_dist=float(vector[4]),
+            water_dist=float(vector[5]),
+            wood_dist=float(vector[6]),
+            wreck_interest=float(vector[7]),
+            player_axe=bool(vector[8]),
+            player_bucket=bool(vector[9]),
+            player_fishing_rod=bool(vector[10]),
+            colony_axes=float(vector[11]),
+            colony_buckets=float(vector[12]),
+            colony_fishing_rods=float(vector[13]),
+        )
+
     def to_list(self) -> List[float]:
         """Returns a formatted list of inputs to be consumed by the neural network"""
         return [
@@ -111,40 +149,199 @@ class NNInputs:
         )
 
 
-class _QNetwork(nn.Module):
-    """Simple Q-Network"""
+def colony_vision(colony, players: List) -> np.ndarray:
+    """
+    Builds the inputs of the neural network for every given player of the colony at once
+    The terms shared by the whole colony are computed a single time
+    :return: A (len(players), amount_of_inputs) matrix, with the columns ordered as in NNInputs.to_list
+    """
+    world = colony._world  # noqa
+    wreck = world._wreck  # noqa
+
+    def distance(needs: int, objective: int) -> float:
+        return 1 - math.exp(-4 * min(max(needs / objective, 0), 1))
+
+    inputs = np.empty((len(players), amount_of_inputs), dtype=np.float32)
+
+    # Shared terms
+    inputs[:, 0:4] = 0
+    inputs[:, int(world.weather)] = 1
+    inputs[:, 4] = distance(colony.food_needs, colony.food_objective)
+    inputs[:, 5] = distance(colony.water_needs, colony.water_objective)
+    inputs[:, 6] = distance(colony.wood_needs, colony.wood_objective)
+    inputs[:, 7] = math.exp(-1.4 * wreck.fail_rate)
+
+    # Tools of each player
+    tools = np.array(
+        [(p.has_axe, p.has_bucket, p.has_fishing_rod) for p in players],
+        dtype=np.float32,
+    ).reshape(len(players), 3)
+    inputs[:, 8:11] = tools
+
+    # Share of the other alive players holding each tool
+    holders = np.array(
+        [colony.axe_holders, colony.bucket_holders, colony.fishing_rod_holders],
+        dtype=np.float64,
+    )
+    inputs[:, 11:14] = (holders - tools) / colony.amount_of_alive_players
+
+    return inputs
+
+
+class MissingWeights(Exception):
+    """Raised when the weights of a brain weren't exported, or were exported from another version of the brain"""
+
+
+# Key of the exported weights holding the SHA-256 of the brain file they were exported from
+SOURCE_KEY = "source_sha256"
+
+
+def weights_location(nn_filename: str) -> str:
+    """The weights of a brain are exported next to its file, as NumPy arrays"""
+    return f"{os.path.splitext(nn_filename)[0]}.npz"
+
+
+def file_sha256(path: str) -> str:
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
 
-    def __init__(self, input_size: int, output_size: int):
-        super(_QNetwork, self).__init__()
+def _load_weights(path: str) -> Dict[str, np.ndarray]:
+    """
+    Reads the exported weights of the brain, never importing torch
+    The weights are exported by save_brain, or by running src.q_network for brains saved before
+    :raises MissingWeights:
+    """
+    weights_path = weights_location(path)
+    export_hint = f"export them with `python -m src.q_network {path}`"
+    if not os.path.exists(weights_path):
+        raise MissingWeights(f"The weights of {path} weren't exported, {export_hint}")
 
-        # Adds two fully-connected layers
-        self.fc1 = nn.Linear(input_size, 28)
-        self.fc2 = nn.Linear(28, output_size)
+    with np.load(weights_path) as weights:
+        source = str(weights[SOURCE_KEY]) if SOURCE_KEY in weights.files else None
+        if source is not None and source != file_sha256(path):
+            raise MissingWeights(
+                f"{weights_path} was exported from another version of {path}, {export_hint}"
+            )
+        return {name: weights[name] for name in weights.files if name != SOURCE_KEY}
 
-    def forward(self, x):
-        x = torch.relu(self.fc1(x))
-        return self.fc2(x)
+
+class _NumpyQNetwork:
+    """Inference of the Q-Network with NumPy, for every row of inputs at once"""
+
+    def __init__(self, weights: Dict[str, np.ndarray]):
+        # Stored transposed and contiguous, the inputs being rows
+        self._w1 = np.ascontiguousarray(weights["fc1.weight"].T, dtype=np.float32)
+        self._b1 = np.ascontiguousarray(weights["fc1.bias"], dtype=np.float32)
+        self._w2 = np.ascontiguousarray(weights["fc2.weight"].T, dtype=np.float32)
+        self._b2 = np.ascontiguousarray(weights["fc2.bias"], dtype=np.float32)
+
+    @classmethod
+    def random(cls, seed: Optional[int] = None):
+        """Draws the weights as torch.nn.Linear initializes them"""
+        rng = np.random.default_rng(seed)
+        weights = {}
+        for layer, (fan_in, fan_out) in [
+            ("fc1", (amount_of_inputs, hidden_size)),
+            ("fc2", (hidden_size, _amount_of_outputs())),
+        ]:
+            bound = 1 / math.sqrt(fan_in)
+            weights[f"{layer}.weight"] = rng.uniform(-bound, bound, (fan_out, fan_in))
+            weights[f"{layer}.bias"] = rng.uniform(-bound, bound, fan_out)
+        return cls(weights)
+
+    def __call__(self, inputs: np.ndarray) -> np.ndarray:
+        hidden = inputs @ self._w1
+        hidden += self._b1
+        np.maximum(hidden, 0, out=hidden)
+        return hidden @ self._w2 + self._b2
+
+
+class _BrainRegistry:
+    """
+    Keeps a single Q-Network per brain file for the whole process
+    Networks are keyed by their resolved path and are reloaded only when the file modification time changes
+    """
+
+    def __init__(self):
+        self._networks: Dict[str, Tuple[int, Callable]] = {}
+        self._fingerprints: Dict[str, Tuple[int, str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, nn_filename: str) -> Callable[[np.ndarray], np.ndarray]:
+        """Returns the shared Q-Network loaded from the given file, taking and returning NumPy arrays"""
+        path = os.path.realpath(nn_filename)
+        mtime = os.stat(path).st_mtime_ns
+
+        with self._lock:
+            cached = self._networks.get(path)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+
+            if brain_backend == "torch":
+                from .q_network import TorchQNetwork, limit_inference_threads
+
+                limit_inference_threads()
+                q_network = TorchQNetwork(path)
+            else:
+                q_network = _NumpyQNetwork(_load_weights(path))
+
+            self._networks[path] = (mtime, q_network)
+            return q_network
+
+    def fingerprint(self, nn_filename: Optional[str]) -> Optional[str]:
+        """
+        Returns the SHA-256 of the brain file, hashed again only when the file modification time changes
+        None when there's no file, the players then using random networks
+        """
+        if not nn_filename or not os.path.exists(nn_filename):
+            return None
+        path = os.path.realpath(nn_filename)
+        mtime = os.stat(path).st_mtime_ns
+
+        with self._lock:
+            cached = self._fingerprints.get(path)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+
+            fingerprint = file_sha256(path)
+
+            self._fingerprints[path] = (mtime, fingerprint)
+            return fingerprint
+
+    def clear(self):
+        """Forget every loaded network"""
+        with self._lock:
+            self._networks.clear()
+            self._fingerprints.clear()
+
+
+brain_registry = _BrainRegistry()
 
 
 class Brain:
-    def __init__(self, nn_filename: str = None):
-        self._q_network = _QNetwork(
-            input_size=amount_of_inputs, output_size=amount_of_outputs
-        )
+    __slots__ = ("_q_network",)
 
+    def __init__(self, nn_filename: str = None, rng: Optional[random.Random] = None):
         if nn_filename and os.path.exists(nn_filename):
-            # Loads from file
-            self._q_network.load_state_dict(torch.load(nn_filename))
-        # else, a random QNetwork is used
-
-        self._q_network.eval()
+            # Loads from file, shared with every other brain using the same file
+            self._q_network = brain_registry.get(nn_filename)
+        else:
+            # else, a random QNetwork is used, drawn from the given generator if any
+            self._q_network = _NumpyQNetwork.random(
+                rng.getrandbits(63) if rng is not None else None
+            )
 
-    def chose_action(self, inputs: NNInputs) -> int:
+    def chose_action(self, inputs: np.ndarray) -> int:
         """Choose the best action to do with the Q-Network
+        :param inputs: A row built by colony_vision
         :return: The ID of the best action
         """
-        _inputs = inputs.to_list()
+        return int(np.argmax(self._q_network(inputs)))
 
-        with torch.no_grad():
-            q_values = self._q_network(torch.Tensor(_inputs))
-            return torch.argmax(q_values).item()
+    def chose_actions(self, inputs: np.ndarray) -> List[int]:
+        """Choose the best action for every row of inputs with a single pass in the Q-Network
+        :param inputs: A matrix built by colony_vision
+        :return: The IDs of the best actions, in the same order as the inputs
+        """
+        return np.argmax(self._q_network(inputs), axis=1).tolist()
@@ -5,14 +5,70 @@ The created brain is then used by the player to make actions during the real gam
 
 """
 
+import os
 import random
+import multiprocessing
+import queue
+import threading
+import time
 import torch
 from torch import nn, optim
-from typing import Dict
+from typing import Dict, List, Tuple, Optional
+import numpy as np
 
 from .game_engine import GameEngine, GameEngineParams
+from .vector_engine import VectorGameEngine
 from .player import PlayerState, _daily_actions
-from .brain import _QNetwork, NNInputs, amount_of_inputs, amount_of_outputs
+from .brain import NNInputs, amount_of_inputs, amount_of_outputs
+from .q_network import _QNetwork
+from .replay_buffer import ReplayBuffer
+from .rollout_worker import rollout_worker, RolloutWorkerError
+from .seeding import SeedStream
+from .progress import ProgressSum, ProgressCallback, TrainingSum
+from .events import EventBus, event_bus, TrainingIteration, TrainingStopped
+
+
+def checkpoint_location(brain_location: str) -> str:
+    """The checkpoint of a training is saved next to its brain"""
+    return f"{brain_location}.ckpt"
+
+
+class EpsilonGreedyPolicy:
+    """Chooses actions with a Q-Network, falling to random actions thanks to greedy epsilon"""
+
+    def __init__(
+        self,
+        q_network: _QNetwork,
+        greedy_epsilon: float,
+        rng: Optional[random.Random] = None,
+    ):
+        self._q_network = q_network
+        self._greedy_epsilon = greedy_epsilon
+        self.rng = rng or random.Random()
+
+    def choose_action(self, inputs: np.ndarray) -> int:
+        """Take the inputs to return an action ID though the greedy epsilon algorithm"""
+
+        # Falls to random action thanks to greedy epsilon
+        if self.rng.random() < self._greedy_epsilon:
+            return self.rng.randint(0, amount_of_outputs - 1)
+
+        # Else, choose the current best action
+        with torch.no_grad():
+            q_values = self._q_network(torch.from_numpy(inputs))
+            return q_values.argmax().item()
+
+    def choose_actions(self, inputs: np.ndarray) -> List[int]:
+        """Same as choose_action, with a single pass in the Q-Network for every row of inputs"""
+        with torch.no_grad():
+            q_values = self._q_network(torch.from_numpy(inputs))
+            action_ids = q_values.argmax(dim=1).tolist()
+
+        # Each decision still falls to a random action thanks to greedy epsilon
+        for i in range(len(action_ids)):
+            if self.rng.random() < self._greedy_epsilon:
+                action_ids[i] = self.rng.randint(0, amount_of_outputs - 1)
+        return action_ids
 
 
 class BrainTrainer:
@@ -24,6 +80,16 @@ class BrainTrainer:
         greedy_epsilon: float,
         iter_amount: int,
         max_win_streak: int,
+        vectorized_games: int = 0,
+        replay_capacity: int = 50_000,
+        batch_size: int = 256,
+        update_frequency: int = 4,
+        warm_up: int = 1_000,
+        workers: int = 0,
+        sync_interval: int = 50,
+        checkpoint_interval: int = 0,
+        resume: bool = False,
+        warm_start: Optional[str] = None,
     ):
         # Learning parameters
         self._learning_rate = learning_rate
@@ -31,106 +97,485 @@ class BrainTrainer:
         self._greedy_epsilon = greedy_epsilon
         self._num_iterations = iter_amount
         self._max_win_streak = max_win_streak
+        # When set, each iteration plays this amount of games in lockstep with the VectorGameEngine
+        self._vectorized_games = vectorized_games
+
+        # Transitions are stored in a replay buffer and learnt by mini-batches
+        # An optimizer step is made every update_frequency new transitions, once warm_up transitions are stored
+        self._replay_buffer = ReplayBuffer(replay_capacity, amount_of_inputs)
+        self._batch_size = batch_size
+        self._update_frequency = update_frequency
+        self._warm_up = max(warm_up, 1)
+        self._pending_updates = 0
+
+        # Every random generator of the training derives from the seed of the game engine parameters
+        # Each game takes the next seed of the stream
+        self._seeds = SeedStream(ge_params.seed)
+        self._rng = np.random.default_rng(self._seeds.next())
+
+        # When set, the games are played by rollout worker processes, the trainer being the learner only
+        # The workers receive the new weights every sync_interval updates
+        self._workers = workers
+        self._sync_interval = sync_interval
+
+        # Statistics
+        self._games_played = 0
+        self._updates = 0
+        self._transitions = 0
+
+        # Progress, saved in the checkpoints every checkpoint_interval iterations
+        self._iteration = 0
+        self._win_streak = 0
+        self._checkpoint_interval = checkpoint_interval
+
+        # Iterations of the training, also published to the process-wide bus
+        self.events = EventBus(parent=event_bus)
+
+        # Set by train
+        self._start = 0.0
+        self._progress: Optional[ProgressCallback] = None
+        self._stop: Optional[threading.Event] = None
 
         # Create a new neural network
-        self._q_network = _QNetwork(
-            input_size=amount_of_inputs, output_size=amount_of_outputs
-        )
+        with torch.random.fork_rng():
+            torch.manual_seed(self._seeds.next())
+            self._q_network = _QNetwork(
+                input_size=amount_of_inputs, output_size=amount_of_outputs
+            )
         self._optimizer = optim.Adam(
             self._q_network.parameters(), lr=self._learning_rate
         )
+        self._loss = nn.MSELoss()
+        self._policy = EpsilonGreedyPolicy(
+            self._q_network, self._greedy_epsilon, random.Random(self._seeds.next())
+        )
 
         # Choose parameters for the game engine
         ge_params.training = True
         ge_params.brain_trainer = self
         self._ge_params = ge_params
 
+        # Start from an existing brain, or from where a previous training stopped
+        if warm_start:
+            self._q_network.load_state_dict(torch.load(warm_start))
+        if resume:
+            self.load_checkpoint()
+
     @property
     def q_net_dict(self) -> Dict:
         return self._q_network.state_dict()
 
-    def choose_action(self, inputs: NNInputs) -> int:
+    """Checkpoints
+    Saved next to the brain, these allow to resume a training
+    """
+
+    @property
+    def checkpoint_location(self) -> str:
+        return checkpoint_location(self._ge_params.brain_location)
+
+    def save_checkpoint(self):
+        """Writes the checkpoint atomically, a crash can't leave a partial file behind"""
+        checkpoint = {
+            "q_network": self._q_network.state_dict(),
+            "optimizer": self._optimizer.state_dict(),
+            "iteration": self._iteration,
+            "win_streak": self._win_streak,
+            "seed_stream": self._seeds.state,
+            "random_state": self._policy.rng.getstate(),
+            "numpy_state": self._rng.bit_generator.state,
+        }
+        temporary_location = f"{self.checkpoint_location}.tmp"
+        torch.save(checkpoint, temporary_location)
+        os.replace(temporary_location, self.checkpoint_location)
+
+    def load_checkpoint(self):
+        """
+        Restores the network, the optimizer, the progress and the random states
+        The replay buffer isn't saved and starts empty
+        :raises FileNotFoundError:
+        """
+        checkpoint = torch.load(self.checkpoint_location, weights_only=False)
+        self._q_network.load_state_dict(checkpoint["q_network"])
+        self._optimizer.load_state_dict(checkpoint["optimizer"])
+        self._iteration = checkpoint["iteration"]
+        self._win_streak = checkpoint["win_streak"]
+        self._seeds = SeedStream(*checkpoint["seed_stream"])
+        self._policy.rng.setstate(checkpoint["random_state"])
+        self._rng.bit_generator.state = checkpoint["numpy_state"]
+
+    def _end_iteration(self, iteration: int, win_streak: int, average_reward: float):
+        """Keeps track of the progress, reports it, and saves a checkpoint when it's time to"""
+        self._iteration = iteration + 1
+        self._win_streak = win_streak
+        if (
+            self._checkpoint_interval
+            and self._iteration % self._checkpoint_interval == 0
+        ):
+            self.save_checkpoint()
+
+        if self._progress is not None:
+            self._progress(
+                ProgressSum(
+                    done=self._iteration,
+                    total=self._num_iterations,
+                    games_played=self._games_played,
+                    games_per_second=self._games_played
+                    / (time.perf_counter() - self._start),
+                    win_streak=win_streak,
+                    average_reward=float(average_reward),
+                )
+            )
+
+    def _should_stop(self, win_streak: int) -> bool:
+        reason = None
+        if win_streak > self._max_win_streak:
+            reason = "Stopped by win streak"
+        elif self._stop is not None and self._stop.is_set():
+            reason = "Stopped on request"
+
+        if reason is not None and self.events.wants(TrainingStopped):
+            self.events.publish(TrainingStopped(reason=reason))
+        return reason is not None
+
+    def _publish_iteration(
+        self, iteration: int, wins: int, games: int, win_streak: int, reward: float
+    ):
+        if self.events.wants(TrainingIteration):
+            self.events.publish(
+                TrainingIteration(
+                    iteration=1 + iteration,
+                    total=self._num_iterations,
+                    wins=int(wins),
+                    games=games,
+                    win_streak=win_streak,
+                    max_win_streak=self._max_win_streak,
+                    average_reward=float(reward),
+                )
+            )
+
+    def _next_game_params(self) -> GameEngineParams:
+        """Returns the parameters of the next training game, with its own seed"""
+        return self._ge_params.model_copy(update={"seed": self._seeds.next()})
+
+    def choose_action(self, inputs: np.ndarray) -> int:
         """Take the inputs to return an action ID though the greedy epsilon algorithm"""
+        return self._policy.choose_action(inputs)
 
-        # Falls to random action thanks to greedy epsilon
-        if random.random() < self._greedy_epsilon:
-            return random.randint(0, amount_of_outputs - 1)
+    def choose_actions(self, inputs: np.ndarray) -> List[int]:
+        """Same as choose_action, with a single pass in the Q-Network for every row of inputs"""
+        return self._policy.choose_actions(inputs)
 
-        # Else, choose the current best action
+    def _learn(
+        self,
+        states: np.ndarray,
+        actions: np.ndarray,
+        rewards: np.ndarray,
+        next_states: np.ndarray,
+        dones: np.ndarray,
+    ):
+        """Observe the results of a batch of chosen actions regarding the inputs"""
+        states = torch.from_numpy(states)
+        actions = torch.from_numpy(actions)
+        q_values = self._q_network(states)
+
+        # Update the value Q of the actions using the Q-learning rule
         with torch.no_grad():
-            q_values = self._q_network(torch.Tensor(inputs.to_list()))
-            return q_values.argmax().item()
+            next_q_values = self._q_network(torch.from_numpy(next_states)).max(dim=1)
+            future = self._discount_factor * next_q_values.values
+            future[torch.from_numpy(dones)] = 0
 
-    def train(self):
-        win_streak = 0
-        for iteration in range(self._num_iterations):
+            rows = torch.arange(len(actions))
+            targets = q_values.detach().clone()
+            targets[rows, actions] += self._learning_rate * (
+                torch.from_numpy(rewards) + future - targets[rows, actions]
+            )
+
+        # Update the Q-Network
+        self._optimizer.zero_grad()
+        loss = self._loss(q_values, targets)
+        loss.backward()
+        self._optimizer.step()
+        self._updates += 1
+
+    def _store(
+        self,
+        states: np.ndarray,
+        actions: np.ndarray,
+        rewards: np.ndarray,
+        next_states: np.ndarray,
+        dones: np.ndarray,
+    ):
+        """Stores the transitions, then learns from the replay buffer as often as required"""
+        self._replay_buffer.push(states, actions, rewards, next_states, dones)
+        self._pending_updates += len(actions)
+        self._transitions += len(actions)
+
+        if len(self._replay_buffer) < self._warm_up:
+            self._pending_updates = 0
+            return
+
+        while self._pending_updates >= self._update_frequency:
+            self._pending_updates -= self._update_frequency
+            self._learn(*self._replay_buffer.sample(self._batch_size, self._rng))
+
+    @staticmethod
+    def collect_transitions(
+        ge: GameEngine,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Returns the transitions of the last day as (states, actions, rewards, next_states, dones)"""
+        states, actions, rewards, next_states, dones = [], [], [], [], []
+        for player in [p for p in ge.colony._players if p.nn_action_taken is not None]:
+            # Take a look of the vision before and after the action
+            states.append(player.nn_vision_before_action)
+            next_states.append(player.nn_vision_after_action)
+            # And the action chosen by the player
+            actions.append(player.nn_action_taken)
+
+            # Compute its reward
+            reward = player.nn_fitness_after_action
+            done = False
+            if player.state is PlayerState.DEAD:
+                reward = 0
+                done = True
+                player.nn_action_taken = None
+            elif player.state is PlayerState.ESCAPED:
+                reward = 100
+                done = True
+                player.nn_action_taken = None
+            rewards.append(reward)
+            dones.append(done)
+            """
+            print(
+                f"Day #{ge.current_day} n°{player.number} "
+                f"{NNInputs.from_vector(states[-1])} : {player.nn_fitness_before_action:.5f} "
+                f"-> {_daily_actions.get_func(actions[-1]).__name__} = {reward:.5f}"
+            )
+            """
+
+        return (
+            np.array(states, dtype=np.float32).reshape(-1, amount_of_inputs),
+            np.array(actions, dtype=np.int64),
+            np.array(rewards, dtype=np.float32),
+            np.array(next_states, dtype=np.float32).reshape(-1, amount_of_inputs),
+            np.array(dones, dtype=bool),
+        )
+
+    def train(
+        self,
+        progress: Optional[ProgressCallback] = None,
+        stop: Optional[threading.Event] = None,
+    ) -> TrainingSum:
+        """
+        Trains the brain, then returns the statistics of the training
+        :param progress: Called at the end of each iteration
+        :param stop: When set, the training stops at the end of the current iteration
+        """
+        self._start = start = time.perf_counter()
+        self._progress = progress
+        self._stop = stop
+        self._games_played = self._updates = self._transitions = 0
+
+        if self._workers:
+            self._train_parallel()
+        elif self._vectorized_games:
+            self._train_vectorized()
+        else:
+            self._train_sequential()
+
+        elapsed_time = time.perf_counter() - start
+        return TrainingSum(
+            brain_location=self._ge_params.brain_location,
+            games_played=self._games_played,
+            updates=self._updates,
+            transitions=self._transitions,
+            elapsed_time=elapsed_time,
+            games_per_second=self._games_played / elapsed_time,
+            updates_per_second=self._updates / elapsed_time,
+            transitions_per_second=self._transitions / elapsed_time,
+        )
+
+    def _train_sequential(self):
+        win_streak = self._win_streak
+        for iteration in range(self._iteration, self._num_iterations):
             # Creates a new game engine for training purposes
-            ge = GameEngine(self._ge_params)
+            ge = GameEngine(self._next_game_params())
             total_reward = 0
+            amount_of_decisions = 0
 
             day_sum = ge.run_single()
             while day_sum is not None:
-                for player in [
-                    p for p in ge.colony._players if p.nn_action_taken is not None
-                ]:
-                    # Take a look of the vision before and after the action
-                    morning_inputs = player.nn_vision_before_action
-                    night_inputs = player.nn_vision_after_action
-                    # And the action chosen by the player
-                    action_taken = player.nn_action_taken
-
-                    # Compute its reward
-                    reward = player.nn_fitness_after_action
-                    if player.state is PlayerState.DEAD:
-                        reward = 0
-                        player.nn_action_taken = None
-                    elif player.state is PlayerState.ESCAPED:
-                        reward = 100
-                        player.nn_action_taken = None
-                    total_reward += reward
-                    """
-                    print(
-                        f"Day #{ge.current_day} n°{player.number} "
-                        f"{morning_inputs} : {player.nn_fitness_before_action:.5f} "
-                        f"-> {_daily_actions.get_func(action_taken).__name__} = {reward:.5f}"
-                    )
-                    """
-                    # Now, observe the result of the chosen action regarding the inputs
-                    q_values = self._q_network(torch.Tensor(morning_inputs.to_list()))
-                    next_q_values = self._q_network(
-                        torch.Tensor(night_inputs.to_list())
-                    )
-
-                    # Update the value Q of the action using the Q-learning rule
-                    q_values[action_taken] += self._learning_rate * (
-                        reward
-                        + self._discount_factor * next_q_values.max()
-                        - q_values[action_taken]
-                    )
-
-                    # Update the Q-Network
-                    self._optimizer.zero_grad()
-                    loss = nn.MSELoss()(
-                        q_values,
-                        self._q_network(torch.Tensor(morning_inputs.to_list())),
-                    )
-                    loss.backward()
-                    self._optimizer.step()
+                transitions = self.collect_transitions(ge)
+                total_reward += transitions[2].sum()
+                amount_of_decisions += len(transitions[2])
+                self._store(*transitions)
 
                 day_sum = ge.run_single()
 
+            self._games_played += 1
             if ge.colony.at_least_one_left_the_isle:
                 win_streak += 1
             else:
                 win_streak = 0
+            average_reward = total_reward / max(amount_of_decisions, 1)
+            self._end_iteration(iteration, win_streak, average_reward)
 
-            if win_streak > self._max_win_streak:
-                print("Stopped by win streak")
+            if self._should_stop(win_streak):
                 break
 
-            print(
-                f"{1+iteration}/{self._num_iterations} "
-                f"{'✔️' if ge.colony.at_least_one_left_the_isle else '❌'} "
-                f"({win_streak}/{self._max_win_streak}) "
-                f"{total_reward/(ge.current_day * len(ge.colony._players))}"
+            self._publish_iteration(
+                iteration,
+                ge.colony.at_least_one_left_the_isle,
+                1,
+                win_streak,
+                average_reward,
             )
+
+    def _train_vectorized(self):
+        """Same as train, but each iteration plays multiple games in lockstep"""
+        win_streak = self._win_streak
+        for iteration in range(self._iteration, self._num_iterations):
+            vge = VectorGameEngine(
+                self._ge_params,
+                self._vectorized_games,
+                record_transitions=True,
+                seed=self._seeds.next(),
+            )
+            total_reward = 0
+            amount_of_decisions = 0
+
+            while not vge.all_games_over:
+                day = vge.step()
+
+                # Same rewards as train
+                dead = day.state_at_night == PlayerState.DEAD
+                escaped = day.state_at_night == PlayerState.ESCAPED
+                rewards = np.where(
+                    dead, 0, np.where(escaped, 100, day.fitness_after_action)
+                ).astype(np.float32)
+                total_reward += rewards.sum()
+                amount_of_decisions += len(rewards)
+
+                self._store(
+                    day.vision_before_action,
+                    day.actions,
+                    rewards,
+                    day.vision_after_action,
+                    dead | escaped,
+                )
+
+            wins = vge.wins
+            self._games_played += len(wins)
+            for won in wins:
+                win_streak = win_streak + 1 if won else 0
+            average_reward = total_reward / max(amount_of_decisions, 1)
+            self._end_iteration(iteration, win_streak, average_reward)
+
+            if self._should_stop(win_streak):
+                break
+
+            self._publish_iteration(
+                iteration, wins.sum(), len(wins), win_streak, average_reward
+            )
+
+    def _send_weights(self, weights: List[multiprocessing.Queue]):
+        state_dict = {k: v.numpy().copy() for k, v in self.q_net_dict.items()}
+        for worker_weights in weights:
+            worker_weights.put(state_dict)
+
+    @staticmethod
+    def _receive(transitions: multiprocessing.Queue, workers: List) -> Tuple:
+        """
+        Waits for the next game played by the workers
+        :raises RolloutWorkerError: When a worker failed or exited, the workers playing until stopped
+        """
+        while True:
+            dead = [worker for worker in workers if not worker.is_alive()]
+            if dead:
+                # A failing worker sends its error before exiting
+                try:
+                    while True:
+                        game = transitions.get_nowait()
+                        if isinstance(game, RolloutWorkerError):
+                            raise game
+                except queue.Empty:
+                    raise RolloutWorkerError(
+                        f"A rollout worker exited with code {dead[0].exitcode}"
+                    )
+
+            try:
+                game = transitions.get(timeout=1)
+            except queue.Empty:
+                continue
+
+            if isinstance(game, RolloutWorkerError):
+                raise game
+            return game
+
+    def _train_parallel(self):
+        """
+        Same as train, but the games are played by rollout workers streaming their transitions
+        The trainer only learns, until iter_amount games were received
+        """
+        # Invalid parameters raise here rather than in every worker
+        GameEngine(self._ge_params)
+
+        context = multiprocessing.get_context("spawn")
+        transitions = context.Queue(maxsize=4 * self._workers)
+        stop = context.Event()
+        weights = [context.Queue() for _ in range(self._workers)]
+
+        # The trainer can't be sent to the workers
+        ge_params = self._ge_params.model_copy(update={"brain_trainer": None})
+        workers = [
+            context.Process(
+                target=rollout_worker,
+                args=(
+                    ge_params,
+                    self._greedy_epsilon,
+                    worker_seed,
+                    worker_weights,
+                    transitions,
+                    stop,
+                ),
+                daemon=True,
+            )
+            for worker_weights, worker_seed in zip(
+                weights, self._seeds.spawn(self._workers)
+            )
+        ]
+        self._send_weights(weights)
+        for worker in workers:
+            worker.start()
+
+        win_streak = self._win_streak
+        last_sync = 0
+        try:
+            for iteration in range(self._iteration, self._num_iterations):
+                *game_transitions, won = self._receive(transitions, workers)
+                self._store(*game_transitions)
+                self._games_played += 1
+
+                if self._updates - last_sync >= self._sync_interval:
+                    self._send_weights(weights)
+                    last_sync = self._updates
+
+                win_streak = win_streak + 1 if won else 0
+                rewards = game_transitions[2]
+                average_reward = rewards.sum() / max(len(rewards), 1)
+                self._end_iteration(iteration, win_streak, average_reward)
+                if self._should_stop(win_streak):
+                    break
+
+                self._publish_iteration(iteration, won, 1, win_streak, average_reward)
+        finally:
+            stop.set()
+            # Unblock the workers waiting for room in the queue
+            try:
+                while True:
+                    transitions.get_nowait()
+            except queue.Empty:
+                ...
+            for worker in workers:
+                worker.join(timeout=5)
+                if worker.is_alive():
+                    worker.terminate()
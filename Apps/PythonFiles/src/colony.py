@@ -1,11 +1,12 @@
 import random
 import math
-from typing import List, Generator
+from typing import List, Generator, Dict, Type, Optional
 from pydantic import BaseModel as PBaseModel
 
 from .base_model import BaseModel
 from .player import Player, PlayerState, PlayerSum
 from .world import World
+from .objects import Object, Axe, Bucket, FishingRod
 
 
 class ColonySum(PBaseModel):
@@ -36,7 +37,9 @@ class Colony(BaseModel):
         amount_of_food_per_player_to_leave: int,
         initial_food_surviving_factor: int,
         initial_water_surviving_factor: int,
+        rng: Optional[random.Random] = None,
     ):
+        self._rng = rng or random.Random()
         self._world = world
         self._players: List[Player] = []
 
@@ -54,6 +57,16 @@ class Colony(BaseModel):
         self._amount_of_water_to_leave = amount_of_water_per_player_to_leave
         self._amount_of_food_to_leave = amount_of_food_per_player_to_leave
 
+        # Live counters, kept up to date by the players themselves
+        self._amount_of_alive_players = 0
+        self._amount_of_escaped_players = 0
+        self._amount_of_dead_players = 0
+        self._alive_item_holders: Dict[Type[Object], int] = {}
+
+    @staticmethod
+    def _is_alive_state(state: PlayerState) -> bool:
+        return state in [PlayerState.ALIVE, PlayerState.SICK]
+
     @property
     def alive_players(self) -> List[Player]:
         """Returns the alive and sick players in the colony"""
@@ -72,22 +85,50 @@ class Colony(BaseModel):
             if player.state in [PlayerState.ALIVE, PlayerState.ESCAPED]
         ]
 
+    @property
+    def amount_of_alive_players(self) -> int:
+        """Returns the amount of alive and sick players in the colony"""
+        return self._amount_of_alive_players
+
+    @property
+    def amount_of_escaped_players(self) -> int:
+        return self._amount_of_escaped_players
+
+    @property
+    def amount_of_dead_players(self) -> int:
+        return self._amount_of_dead_players
+
+    """Item holders
+    Amount of alive players holding a certain type of item
+    """
+
+    def amount_of_item_holders(self, item_class: Type[Object]) -> int:
+        return self._alive_item_holders.get(item_class, 0)
+
+    @property
+    def axe_holders(self) -> int:
+        return self.amount_of_item_holders(Axe)
+
+    @property
+    def bucket_holders(self) -> int:
+        return self.amount_of_item_holders(Bucket)
+
+    @property
+    def fishing_rod_holders(self) -> int:
+        return self.amount_of_item_holders(FishingRod)
+
     @property
     def at_least_one_left_the_isle(self) -> bool:
-        for player in self._players:
-            if player.state is PlayerState.ESCAPED:
-                return True
-        return False
+        return self._amount_of_escaped_players > 0
 
     @property
     def able_to_leave(self) -> bool:
         """Returns the possibility for the colony to leave"""
+        alive = self._amount_of_alive_players
         return (
-            self.wood_amount >= len(self.alive_players) * self._amount_of_wood_to_leave
-            and self.food_amount
-            >= len(self.alive_players) * self._amount_of_food_to_leave
-            and self.water_level
-            >= len(self.alive_players) * self._amount_of_water_to_leave
+            self.wood_amount >= alive * self._amount_of_wood_to_leave
+            and self.food_amount >= alive * self._amount_of_food_to_leave
+            and self.water_level >= alive * self._amount_of_water_to_leave
         )
 
     @property
@@ -97,21 +138,21 @@ class Colony(BaseModel):
 
     @property
     def enough_resources(self) -> bool:
-        return self.limiting_factor >= len(self.alive_players)
+        return self.limiting_factor >= self._amount_of_alive_players
 
     """Objectives"""
 
     @property
     def water_objective(self) -> int:
-        return (self._amount_of_water_to_leave + 1) * len(self.alive_players)
+        return (self._amount_of_water_to_leave + 1) * self._amount_of_alive_players
 
     @property
     def food_objective(self) -> int:
-        return (self._amount_of_food_to_leave + 1) * len(self.alive_players)
+        return (self._amount_of_food_to_leave + 1) * self._amount_of_alive_players
 
     @property
     def wood_objective(self) -> int:
-        return self._amount_of_wood_to_leave * len(self.alive_players)
+        return self._amount_of_wood_to_leave * self._amount_of_alive_players
 
     """Needs"""
 
@@ -194,13 +235,45 @@ class Colony(BaseModel):
     def add_player(self, player: Player):
         """Adds a new player in the colony"""
         self._players.append(player)
+        self._count_player(player, player.state, 1)
 
         # Add resources to live one day
         self.add_water(self._initial_water_surviving_factor)
         self.add_food(self._initial_food_surviving_factor)
 
+    def _count_player(self, player: Player, state: PlayerState, increment: int):
+        """Adds the increment to the counters matching the given player state"""
+        if self._is_alive_state(state):
+            self._amount_of_alive_players += increment
+            for item_class in player.item_classes:
+                self._alive_item_holders[item_class] = (
+                    self.amount_of_item_holders(item_class) + increment
+                )
+        elif state is PlayerState.ESCAPED:
+            self._amount_of_escaped_players += increment
+        elif state is PlayerState.DEAD:
+            self._amount_of_dead_players += increment
+
+    def player_state_changed(
+        self, player: Player, old_state: PlayerState, new_state: PlayerState
+    ):
+        """Updates the counters when a player changes its state, called by the player itself"""
+        self._count_player(player, old_state, -1)
+        self._count_player(player, new_state, 1)
+
+    def player_item_found(self, player: Player, item_class: Type[Object]):
+        """Updates the counters when a player gets a new item, called by the player itself"""
+        if self._is_alive_state(player.state):
+            self._alive_item_holders[item_class] = (
+                self.amount_of_item_holders(item_class) + 1
+            )
+
     def get_random_alive_player(self) -> Player:
-        return random.choice(self.alive_players)
+        return self._rng.choice(self.alive_players)
+
+    def get_random_alive_players(self, amount: int) -> List[Player]:
+        """Returns distinct alive players, the alive players being listed once"""
+        return self._rng.sample(self.alive_players, amount)
 
     def dine(self) -> Generator[Player, None, None]:
         """Make every player eat and drink and returns an iterator of the players that eat and drink"""
@@ -0,0 +1,214 @@
+"""
+Evaluation of a brain over many games
+
+Each game takes its own seed from the root seed, then the games are split into shards of consecutive games.
+The vectorized games are played by blocks of VECTOR_BLOCK games, each block taking the seed of its first game.
+The results then don't depend on the amount of workers, nor on the scheduling.
+
+Shards can be played by the process pool, each process keeping the brains loaded between calls.
+The pool is started by the API and shared by every test, see start_pool.
+
+When a target width is given for the confidence interval of the win ratio,
+the games are played by rounds until the Wilson interval is narrow enough.
+"""
+
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from statistics import NormalDist
+from typing import List, Optional, Tuple
+
+from .game_engine import GameEngine, GameEngineParams
+from .vector_engine import VectorGameEngine
+from .seeding import SeedStream
+from .progress import ProgressSum, ProgressCallback, TestSum
+
+
+@dataclass
+class _ShardResult:
+    wins: int
+    games: int
+    days: int
+
+
+# Amount of vectorized games played together
+VECTOR_BLOCK = 256
+
+# Most processes a test can use
+max_workers = os.cpu_count() or 1
+
+
+def _play_shard(
+    ge_params: GameEngineParams, seeds: List[int], vectorized: bool
+) -> _ShardResult:
+    """Plays a shard of games, one per seed"""
+    result = _ShardResult(wins=0, games=len(seeds), days=0)
+    if vectorized:
+        for i in range(0, len(seeds), VECTOR_BLOCK):
+            block = seeds[i : i + VECTOR_BLOCK]
+            vge = VectorGameEngine(ge_params, len(block), seed=block[0])
+            vge.run()
+            result.wins += int(vge.wins.sum())
+            result.days += int(vge.days.sum())
+        return result
+
+    for game_seed in seeds:
+        ge = GameEngine(ge_params.model_copy(update={"seed": game_seed}))
+        while ge.run_single() is not None:
+            ...
+        result.wins += ge.colony.at_least_one_left_the_isle
+        result.days += ge.current_day
+    return result
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def start_pool() -> ProcessPoolExecutor:
+    """Returns the process pool, of max_workers processes, started on the first call"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def _split(seeds: List[int], shards: int, block: int) -> List[List[int]]:
+    """Splits the seeds in nearly equal shards of consecutive seeds, made of whole blocks"""
+    blocks = math.ceil(len(seeds) / block)
+    shards = max(1, min(shards, blocks))
+    bounds = [0]
+    for i in range(shards):
+        bounds.append(bounds[-1] + blocks // shards + (1 if i < blocks % shards else 0))
+    return [
+        seeds[start * block : end * block] for start, end in zip(bounds, bounds[1:])
+    ]
+
+
+def wilson_interval(wins: int, games: int, confidence: float) -> Tuple[float, float]:
+    """
+    Returns the Wilson score interval of the win ratio at the given confidence level
+    :raises ValueError: When the confidence isn't between 0 and 1 excluded, or the wins between 0 and the games
+    """
+    if not 0 < confidence < 1:
+        raise ValueError("The confidence should be between 0 and 1 excluded")
+    if not 0 <= wins <= games:
+        raise ValueError("The wins should be between 0 and the amount of games")
+    if games == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    ratio = wins / games
+    denominator = 1 + z**2 / games
+    center = (ratio + z**2 / (2 * games)) / denominator
+    margin = (
+        z
+        * math.sqrt(ratio * (1 - ratio) / games + z**2 / (4 * games**2))
+        / denominator
+    )
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def _play(
+    ge_params: GameEngineParams,
+    amount_of_games: int,
+    workers: int,
+    seeds: SeedStream,
+    vectorized: bool,
+) -> List[_ShardResult]:
+    """Plays the games in shards, each game taking the next seed of the stream"""
+    shards = _split(
+        seeds.spawn(amount_of_games), workers, VECTOR_BLOCK if vectorized else 1
+    )
+    args = [[ge_params] * len(shards), shards, [vectorized] * len(shards)]
+
+    if len(shards) <= 1:
+        return list(map(_play_shard, *args))
+    return list(start_pool().map(_play_shard, *args))
+
+
+def evaluate(
+    ge_params: GameEngineParams,
+    amount_of_games: int,
+    workers: int = 1,
+    seed: Optional[int] = None,
+    vectorized: bool = False,
+    target_interval_width: Optional[float] = None,
+    confidence: float = 0.95,
+    round_size: int = 100,
+    progress: Optional[ProgressCallback] = None,
+    stop: Optional[threading.Event] = None,
+) -> TestSum:
+    """
+    Plays the games and returns the statistics of the brain
+    :param workers: Amount of processes playing the games, the games are played in this process when 1
+    :param seed: Root seed of the games, fresh entropy is used when None
+    :param target_interval_width: When given, stops as soon as the confidence interval is narrower.
+        amount_of_games is then the maximum amount of games played
+    :param round_size: Amount of games played between two checks of the confidence interval
+    :param progress: When given, the games are played by rounds and this is called after each of them
+    :param stop: When set, the games stop at the end of the current round
+    """
+    if not 1 <= workers <= max_workers:
+        raise ValueError(f"Between 1 and {max_workers} workers can play the games")
+    if target_interval_width is not None and target_interval_width <= 0:
+        raise ValueError("The target width of the interval should be positive")
+    if not 0 < confidence < 1:
+        raise ValueError("The confidence should be between 0 and 1 excluded")
+    start = time.perf_counter()
+
+    seeds = SeedStream(seed)
+    results: List[_ShardResult] = []
+    wins = games = 0
+    while games < amount_of_games:
+        round_games = amount_of_games - games
+        if target_interval_width is not None or progress or stop:
+            round_games = min(round_games, round_size)
+
+        round_results = _play(ge_params, round_games, workers, seeds, vectorized)
+        results += round_results
+        wins = sum(r.wins for r in results)
+        games = sum(r.games for r in results)
+
+        if progress is not None:
+            progress(
+                ProgressSum(
+                    done=games,
+                    total=amount_of_games,
+                    games_played=games,
+                    games_per_second=games / (time.perf_counter() - start),
+                    win_ratio=wins / games,
+                )
+            )
+        if stop is not None and stop.is_set():
+            break
+        if target_interval_width is not None:
+            low, high = wilson_interval(wins, games, confidence)
+            if high - low <= target_interval_width:
+                break
+
+    return TestSum(
+        win_ratio=wins / games if games else 0,
+        win_ratio_interval=wilson_interval(wins, games, confidence),
+        confidence=confidence,
+        wins=wins,
+        losses=games - wins,
+        games_played=games,
+        mean_days_survived=sum(r.days for r in results) / games if games else 0,
+        wall_clock_time=time.perf_counter() - start,
+    )
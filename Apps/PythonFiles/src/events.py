@@ -0,0 +1,252 @@
+"""
+Events of the games and trainings
+
+The game engines and the trainer publish typed events, and subscribers register a callback per type of event.
+Events are only built when a callback is registered for their type, nothing is formatted otherwise.
+
+Built-in subscribers :
+- ConsoleSubscriber prints the events as the game used to, see GameEngineParams.print_game
+- JsonLinesSubscriber writes them to a file, one JSON object per line, by buffered batches
+
+Each GameEngine has its own bus, whose events are also published to the process-wide event_bus.
+The process-wide bus is configured from the environment, nothing being printed by default :
+- CONSOLE_EVENTS : "summary" prints the end of the games and the training iterations, "none" (default) prints nothing
+- EVENTS_FILE : when set, every event of the process is written to this JSON-lines file
+"""
+
+import atexit
+import json
+import os
+import threading
+from dataclasses import dataclass, field, fields
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional, Type
+
+from .world import Weather
+from .player import _daily_actions
+
+
+def _transient():
+    """Field given to the console subscriber only, not written to the JSON-lines files"""
+    return field(default=None, repr=False, compare=False, metadata={"transient": True})
+
+
+@dataclass
+class Event:
+    def to_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {"event": type(self).__name__}
+        for f in fields(self):
+            if f.metadata.get("transient"):
+                continue
+            value = getattr(self, f.name)
+            data[f.name] = value.name if isinstance(value, Enum) else value
+        return data
+
+
+@dataclass
+class DayStarted(Event):
+    day: int
+    weather: Weather
+    world: Any = _transient()
+    colony: Any = _transient()
+
+
+@dataclass
+class ActionTaken(Event):
+    day: int
+    player: int
+    action_id: int
+    items: int
+
+
+@dataclass
+class PlayerDied(Event):
+    day: int
+    player: int
+    items: int
+
+
+@dataclass
+class ColonyDined(Event):
+    day: int
+    players: int
+
+
+@dataclass
+class PlayerEscaped(Event):
+    day: int
+    player: int
+    items: int
+
+
+@dataclass
+class GameEnded(Event):
+    victory: bool
+    days: int
+
+
+@dataclass
+class TrainingIteration(Event):
+    iteration: int
+    total: int
+    wins: int
+    games: int
+    win_streak: int
+    max_win_streak: int
+    average_reward: float
+
+
+@dataclass
+class TrainingStopped(Event):
+    reason: str
+
+
+DAY_EVENTS: List[Type[Event]] = [
+    DayStarted,
+    ActionTaken,
+    PlayerDied,
+    ColonyDined,
+    PlayerEscaped,
+]
+SUMMARY_EVENTS: List[Type[Event]] = [GameEnded, TrainingIteration, TrainingStopped]
+ALL_EVENTS = DAY_EVENTS + SUMMARY_EVENTS
+
+Callback = Callable[[Event], None]
+
+
+class EventBus:
+    def __init__(self, parent: Optional["EventBus"] = None):
+        """:param parent: Bus to which every event is also published"""
+        self._parent = parent
+        self._subscribers: Dict[Type[Event], List[Callback]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, event_type: Type[Event], callback: Callback):
+        with self._lock:
+            # Lists are replaced rather than modified, publishing doesn't need the lock
+            callbacks = self._subscribers.get(event_type, [])
+            self._subscribers[event_type] = callbacks + [callback]
+
+    def unsubscribe(self, event_type: Type[Event], callback: Callback):
+        with self._lock:
+            callbacks = [
+                c for c in self._subscribers.get(event_type, []) if c != callback
+            ]
+            if callbacks:
+                self._subscribers[event_type] = callbacks
+            else:
+                self._subscribers.pop(event_type, None)
+
+    def wants(self, event_type: Type[Event]) -> bool:
+        """Whether an event of this type would be received, to be checked before building it"""
+        if event_type in self._subscribers:
+            return True
+        return self._parent is not None and self._parent.wants(event_type)
+
+    def publish(self, event: Event):
+        for callback in self._subscribers.get(type(event), ()):
+            callback(event)
+        if self._parent is not None:
+            self._parent.publish(event)
+
+
+event_bus = EventBus()
+
+
+class ConsoleSubscriber:
+    """Prints the events"""
+
+    def attach(self, bus: EventBus, event_types: List[Type[Event]] = ALL_EVENTS):
+        for event_type in event_types:
+            bus.subscribe(event_type, self)
+
+    def __call__(self, event: Event):
+        print(self.format(event))
+
+    @staticmethod
+    def format(event: Event) -> str:
+        if isinstance(event, DayStarted):
+            return (
+                f"/ --- DAWN OF DAY #{event.day} ({event.weather.name})\n"
+                f"| World : {event.world}\n"
+                f"| Colony : {event.colony}\n"
+                f"\\ ---"
+            )
+        if isinstance(event, ActionTaken):
+            return (
+                f"N°{event.player} ({event.items} items) "
+                f"{_daily_actions.get_func(event.action_id).__name__}"
+            )
+        if isinstance(event, PlayerDied):
+            return f"N°{event.player} ({event.items} items) died"
+        if isinstance(event, ColonyDined):
+            return f"{event.players} players ate and drank"
+        if isinstance(event, PlayerEscaped):
+            return f"N°{event.player} ({event.items} items) leave !"
+        if isinstance(event, GameEnded):
+            return (
+                f"{'✔️ victory' if event.victory else '❌ defeat'} ({event.days} days)"
+            )
+        if isinstance(event, TrainingIteration):
+            if event.games == 1:
+                outcome = "✔️" if event.wins else "❌"
+            else:
+                outcome = f"{event.wins}/{event.games} ✔️"
+            return (
+                f"{event.iteration}/{event.total} {outcome} "
+                f"({event.win_streak}/{event.max_win_streak}) {event.average_reward}"
+            )
+        if isinstance(event, TrainingStopped):
+            return event.reason
+        return str(event)
+
+
+class JsonLinesSubscriber:
+    """Writes the events to a file, one JSON object per line, buffer_size events at a time"""
+
+    def __init__(self, location: str, buffer_size: int = 256):
+        self._location = location
+        self._buffer_size = buffer_size
+        self._buffer: List[str] = []
+        self._lock = threading.Lock()
+
+    def attach(self, bus: EventBus, event_types: List[Type[Event]] = ALL_EVENTS):
+        for event_type in event_types:
+            bus.subscribe(event_type, self)
+
+    def __call__(self, event: Event):
+        line = json.dumps(event.to_dict())
+        with self._lock:
+            self._buffer.append(line)
+            if len(self._buffer) >= self._buffer_size:
+                self._flush()
+
+    def _flush(self):
+        """Lock held"""
+        if not self._buffer:
+            return
+        with open(self._location, "a") as file:
+            file.write("\n".join(self._buffer) + "\n")
+        self._buffer.clear()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+
+# Whether the process-wide bus prints the summary events
+console_summary = os.environ.get("CONSOLE_EVENTS", "none") == "summary"
+
+
+def _configure_from_environment():
+    if console_summary:
+        ConsoleSubscriber().attach(event_bus, SUMMARY_EVENTS)
+
+    events_file = os.environ.get("EVENTS_FILE")
+    if events_file:
+        subscriber = JsonLinesSubscriber(events_file)
+        subscriber.attach(event_bus)
+        atexit.register(subscriber.flush)
+
+
+_configure_from_environment()
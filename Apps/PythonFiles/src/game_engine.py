@@ -1,11 +1,32 @@
-from typing import List, Optional, Any
+import random
+from typing import List, Optional, Any, Generator, Union
+import numpy as np
 from pydantic import BaseModel as PBaseModel, FilePath
 
 from .wreck import Wreck, WreckSum
 from .world import World, WorldSum, Weather
 from .colony import Colony, ColonySum
 from .player import Player, _daily_actions
+from .brain import Brain, colony_vision
 from .objects import Bucket, Axe, FishingRod
+from .instrumentation import (
+    PhaseTimer,
+    DayMetricsSum,
+    GameMetricsSum,
+    metrics_registry,
+)
+from .events import (
+    EventBus,
+    ConsoleSubscriber,
+    event_bus,
+    console_summary,
+    DayStarted,
+    ActionTaken,
+    PlayerDied,
+    ColonyDined,
+    PlayerEscaped,
+    GameEnded,
+)
 
 
 class PlayerAction(PBaseModel):
@@ -28,11 +49,18 @@ class DaySum(PBaseModel):
 class GameSum(PBaseModel):
     initial_state: GameStateSum
     days: List[DaySum]
+    # Only for instrumented games
+    metrics: Optional[GameMetricsSum] = None
 
 
 class GameEngineParams(PBaseModel):
     number_of_players: int = 22
     print_game: bool = False
+    # Every player chooses its action from the dawn state, with a single pass in the neural network.
+    # When disabled, players act one after the other and see the resources fetched by the previous ones
+    batch_decisions: bool = False
+    # Measures the phases of each day, see instrumentation
+    instrument: bool = False
     # Wreck
     wreck_probability: Optional[float] = 0.5
     bucket_amount: Optional[int] = 1
@@ -52,6 +80,8 @@ class GameEngineParams(PBaseModel):
     amount_of_food_per_player_to_leave: Optional[int] = 1
     initial_food_surviving_factor: Optional[int] = 1
     initial_water_surviving_factor: Optional[int] = 1
+    # Same seed and brain give the same game, a random seed is used when None
+    seed: Optional[int] = None
     # Training options
     brain_location: Optional[FilePath] = "brains/trained_q_network.pth"
     training: bool = False
@@ -66,10 +96,25 @@ class GameEngine:
     """
 
     def __init__(self, ge_params: GameEngineParams):
-        self._print_game = ge_params.print_game
+        # Events of this game, also published to the process-wide bus
+        self.events = EventBus(parent=event_bus)
+        if ge_params.print_game:
+            # The end of the game is printed once, when the process-wide bus doesn't already
+            ConsoleSubscriber().attach(
+                self.events,
+                [DayStarted, ActionTaken, PlayerDied, PlayerEscaped]
+                + ([] if console_summary else [GameEnded]),
+            )
+        self._batch_decisions = ge_params.batch_decisions
+        self._training = ge_params.training
+        self._instrument = ge_params.instrument
+        self._timer: Optional[PhaseTimer] = None
+        self._day_metrics: List[DayMetricsSum] = []
+        # Every random draw of the game comes from this generator
+        self._rng = random.Random(ge_params.seed)
 
         # Create wreck
-        wreck = Wreck(ge_params.wreck_probability)
+        wreck = Wreck(ge_params.wreck_probability, rng=self._rng)
         wreck.add_item(Bucket, ge_params.bucket_amount)
         wreck.add_item(Axe, ge_params.axe_amount)
         wreck.add_item(FishingRod, ge_params.fishing_rod_amount)
@@ -85,6 +130,7 @@ class GameEngine:
             basic_wood_fetch_factor=ge_params.basic_wood_fetch_factor or [1, 2, 3],
             basic_food_fetch_factor=ge_params.basic_food_fetch_factor or [1, 2, 3],
             default_weather=ge_params.default_weather,
+            rng=self._rng,
         )
 
         # Create colony
@@ -95,90 +141,186 @@ class GameEngine:
             amount_of_food_per_player_to_leave=ge_params.amount_of_food_per_player_to_leave,
             initial_food_surviving_factor=ge_params.initial_food_surviving_factor,
             initial_water_surviving_factor=ge_params.initial_water_surviving_factor,
+            rng=self._rng,
         )
 
-        # Add players
+        # A single brain plays for every player, in both decision modes.
+        # Without brain file, it's a random network drawn from the game generator
+        brain = None
+        if not ge_params.training:
+            brain = Brain(ge_params.brain_location, self._rng)
+
+        # Add players, their brain being only used by the sequential decisions
         for i in range(0, ge_params.number_of_players):
             self.colony.add_player(
                 Player(
                     number=i,
                     colony=self.colony,
-                    brain_location=ge_params.brain_location,
+                    brain=None if self._batch_decisions else brain,
                     training=ge_params.training,
                     trainer=ge_params.brain_trainer,
+                    rng=self._rng,
                 )
             )
 
+        # Decision maker used by the batched decisions
+        self._decision_maker = ge_params.brain_trainer if ge_params.training else brain
+
         # Initiate day counter
         self._day = 0
 
     @property
     def _game_over(self) -> bool:
         """The game is over iff every player is dead or gone"""
-        return len(self.colony.alive_players) <= 0
+        return self.colony.amount_of_alive_players <= 0
 
     @property
     def current_day(self) -> int:
         return self._day
 
+    def _choose_actions(self, inputs: np.ndarray) -> List[int]:
+        """Choose the actions of every row of inputs at once"""
+        if len(inputs) == 0:
+            return []
+        if isinstance(self._decision_maker, Brain):
+            return self._decision_maker.chose_actions(inputs)
+        return self._decision_maker.choose_actions(inputs)
+
     def _update(self) -> DaySum:
         """This updates the game and make the _actions of a complete day, from dawn to dawn"""
+        actions = self._play_day()
+        day = DaySum(
+            day=self._day,
+            actions=actions,
+            night_state=self.summarize_state(),
+        )
+
+        if self._timer is not None:
+            self._timer.lap("summary")
+            day_metrics = self._timer.summarize(self._day)
+            self._day_metrics.append(day_metrics)
+            metrics_registry.record(day_metrics)
+        return day
+
+    def _play_day(self) -> List[PlayerAction]:
+        """Same as _update, without the summary of the night state"""
+        timer = self._timer = PhaseTimer() if self._instrument else None
 
         # Step zero, world update
         self._day += 1
         self._world.update()
 
-        if self._print_game:
-            print(
-                f"/ --- DAWN OF DAY #{self._day} ({self._world.weather.name})\n"
-                f"| World : {self._world}\n"
-                f"| Colony : {self.colony}\n"
-                f"\\ ---"
+        if self.events.wants(DayStarted):
+            self.events.publish(
+                DayStarted(
+                    day=self._day,
+                    weather=self._world.weather,
+                    world=self._world,
+                    colony=self.colony,
+                )
             )
 
+        if timer is not None:
+            timer.lap("world_update")
+
         # First step : daily actions
         actions: List[PlayerAction] = []
-        for player in self.colony.alive_players:
-            action_id = player.make_best_daily_action()
+        players = self.colony.alive_players
+        if self._batch_decisions:
+            inputs = colony_vision(self.colony, players)
+            if self._training:
+                # The trainer learns from the visions around each action
+                for player, vision in zip(players, inputs):
+                    player.look_before_action(vision)
+                action_ids = self._choose_actions(inputs)
+                for player, action_id in zip(players, action_ids):
+                    player.make_chosen_daily_action(action_id)
+            else:
+                action_ids = self._choose_actions(inputs)
+                _daily_actions.call_actions(action_ids, players)
+        else:
+            action_ids = [player.make_best_daily_action() for player in players]
+
+        for player, action_id in zip(players, action_ids):
             actions.append(
                 PlayerAction(
                     player_id=player.number,
                     action_id=action_id,
                 )
             )
-            if self._print_game:
-                print(f"{player} {_daily_actions.get_func(action_id).__name__}")
+        if self.events.wants(ActionTaken):
+            for player, action_id in zip(players, action_ids):
+                self.events.publish(
+                    ActionTaken(
+                        day=self._day,
+                        player=player.number,
+                        action_id=action_id,
+                        items=len(player.item_classes),
+                    )
+                )
+
+        if timer is not None:
+            timer.lap("actions")
+            timer.decisions = len(players)
+            if self._batch_decisions:
+                timer.forward_calls = 1 if players else 0
+            else:
+                timer.forward_calls = len(players)
 
         # Second step : Some must die
         if not self.colony.enough_resources:
             limiting_factor = self.colony.limiting_factor
-            amount_of_players_to_die = len(self.colony.alive_players) - limiting_factor
+            amount_of_players_to_die = (
+                self.colony.amount_of_alive_players - limiting_factor
+            )
 
-            for _ in range(0, amount_of_players_to_die):
-                player_to_die = self.colony.get_random_alive_player()
+            for player_to_die in self.colony.get_random_alive_players(
+                amount_of_players_to_die
+            ):
                 player_to_die.die(self.current_day)
-                if self._print_game:
-                    print(f"{player_to_die} died")
+                if self.events.wants(PlayerDied):
+                    self.events.publish(
+                        PlayerDied(
+                            day=self._day,
+                            player=player_to_die.number,
+                            items=len(player_to_die.item_classes),
+                        )
+                    )
+
+        if timer is not None:
+            timer.lap("deaths")
 
         if not self._game_over:
             # Third step : Diner
-            for _ in self.colony.dine():
-                ...
+            diners = sum(1 for _ in self.colony.dine())
+            if self.events.wants(ColonyDined):
+                self.events.publish(ColonyDined(day=self._day, players=diners))
+
+            if timer is not None:
+                timer.lap("dining")
 
             # Fourth step : Verify if there's enough resources to leave
             if self.colony.able_to_leave:
                 for player in self.colony.leave_isle():
-                    if self._print_game:
-                        print(f"{player} leave !")
-
-        return DaySum(
-            day=self._day,
-            actions=actions,
-            night_state=GameStateSum(
-                world=self._world.summarize(),
-                wreck=self._wreck.summarize(),
-                colony=self.colony.summarize(),
-            ),
+                    if self.events.wants(PlayerEscaped):
+                        self.events.publish(
+                            PlayerEscaped(
+                                day=self._day,
+                                player=player.number,
+                                items=len(player.item_classes),
+                            )
+                        )
+
+            if timer is not None:
+                timer.lap("leaving")
+
+        return actions
+
+    def summarize_state(self) -> GameStateSum:
+        return GameStateSum(
+            world=self._world.summarize(),
+            wreck=self._wreck.summarize(),
+            colony=self.colony.summarize(),
         )
 
     def run(self) -> GameSum:
@@ -186,26 +328,34 @@ class GameEngine:
         days: List[DaySum] = []
 
         # Compute initial state
-        initial_state = GameStateSum(
-            world=self._world.summarize(),
-            wreck=self._wreck.summarize(),
-            colony=self.colony.summarize(),
-        )
+        initial_state = self.summarize_state()
 
         # Compute days
         while not self._game_over:
             day = self._update()
             days.append(day)
 
-        print(
-            f"{'✔️ victory' if self.colony.at_least_one_left_the_isle else '❌ defeat'} ({self.current_day} days)"
-        )
+        if self.events.wants(GameEnded):
+            self.events.publish(
+                GameEnded(
+                    victory=self.colony.at_least_one_left_the_isle,
+                    days=self.current_day,
+                )
+            )
 
         return GameSum(
             initial_state=initial_state,
             days=days,
+            metrics=self.metrics,
         )
 
+    @property
+    def metrics(self) -> Optional[GameMetricsSum]:
+        """Measures of the days played so far, None unless instrumented"""
+        if not self._instrument:
+            return None
+        return GameMetricsSum.from_days(self._day_metrics)
+
     def run_single(self) -> Optional[DaySum]:
         """Runs a single day if game is not over
         returns the day summary
@@ -213,3 +363,27 @@ class GameEngine:
         if self._game_over:
             return None
         return self._update()
+
+    def seek(self, day: int) -> Optional[DaySum]:
+        """
+        Runs the game up to the given day and returns its summary
+        The days before are simulated without being summarized
+        returns None if the game is over before that day
+        """
+        if day <= self._day:
+            raise ValueError(f"Day #{day} is already over")
+        while self._day < day - 1 and not self._game_over:
+            self._play_day()
+        return self.run_single()
+
+    def stream(self) -> Generator[Union[GameStateSum, DaySum], None, None]:
+        """
+        Same as run, but yields the initial state then each day as soon as it is simulated
+        Nothing is kept in memory once given away
+        """
+        yield self.summarize_state()
+
+        day = self.run_single()
+        while day is not None:
+            yield day
+            day = self.run_single()
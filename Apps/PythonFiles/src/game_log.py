@@ -0,0 +1,153 @@
+"""
+Compact game log
+
+A GameSum repeats the whole colony every day, while only a few players change from one day to another.
+A GameLog keeps the initial state, then for each day :
+- the actions of the players
+- the new weather, if it changed
+- the resource deltas of the world, the wreck and the colony, if not null
+- the changed fields of the players that changed
+
+Fields left to None are not sent. decode_game_log rebuilds the complete GameSum.
+"""
+
+from typing import List, Optional, Dict
+from pydantic import BaseModel as PBaseModel
+
+from .game_engine import GameSum, DaySum, GameStateSum, PlayerAction
+from .world import Weather
+from .player import PlayerSum
+
+
+class PlayerDelta(PBaseModel):
+    number: int
+    alive: Optional[bool] = None
+    has_bucket: Optional[bool] = None
+    has_axe: Optional[bool] = None
+    has_fishing_rod: Optional[bool] = None
+
+
+class DayDelta(PBaseModel):
+    day: int
+    actions: List[PlayerAction]
+    weather: Optional[Weather] = None
+    world: Optional[Dict[str, int]] = None
+    wreck: Optional[Dict[str, int]] = None
+    colony: Optional[Dict[str, int]] = None
+    players: Optional[List[PlayerDelta]] = None
+
+
+class GameLog(PBaseModel):
+    initial_state: GameStateSum
+    days: List[DayDelta]
+
+
+# Fields encoded as deltas
+_WORLD_RESOURCES = ["water", "food", "wood"]
+_WRECK_RESOURCES = ["buckets", "axes", "fishing_rods"]
+_COLONY_RESOURCES = [
+    "water",
+    "food",
+    "wood",
+    "water_needs",
+    "food_needs",
+    "wood_needs",
+]
+_PLAYER_FIELDS = ["alive", "has_bucket", "has_axe", "has_fishing_rod"]
+
+
+def _deltas(
+    previous: PBaseModel, current: PBaseModel, fields: List[str]
+) -> Optional[Dict[str, int]]:
+    """Returns the non-null differences of the given fields, None if nothing changed"""
+    deltas = {
+        field: getattr(current, field) - getattr(previous, field)
+        for field in fields
+        if getattr(current, field) != getattr(previous, field)
+    }
+    return deltas or None
+
+
+def _apply(
+    previous: PBaseModel, deltas: Optional[Dict[str, int]], fields: List[str]
+) -> Dict[str, int]:
+    deltas = deltas or {}
+    return {field: getattr(previous, field) + deltas.get(field, 0) for field in fields}
+
+
+def _apply_player(player: PlayerSum, delta: Optional[PlayerDelta]) -> PlayerSum:
+    if delta is None:
+        return player
+    return player.model_copy(update=delta.model_dump(exclude_none=True))
+
+
+class GameLogEncoder:
+    """Encodes the days of a game one after the other, each compared to the previous one"""
+
+    def __init__(self, initial_state: GameStateSum):
+        self._previous = initial_state
+
+    def encode(self, day: DaySum) -> DayDelta:
+        previous, current = self._previous, day.night_state
+        self._previous = current
+
+        players: List[PlayerDelta] = []
+        for old, new in zip(previous.colony.players, current.colony.players):
+            changes = {
+                field: getattr(new, field)
+                for field in _PLAYER_FIELDS
+                if getattr(new, field) != getattr(old, field)
+            }
+            if changes:
+                players.append(PlayerDelta(number=new.number, **changes))
+
+        return DayDelta(
+            day=day.day,
+            actions=day.actions,
+            weather=(
+                current.world.weather
+                if current.world.weather != previous.world.weather
+                else None
+            ),
+            world=_deltas(previous.world, current.world, _WORLD_RESOURCES),
+            wreck=_deltas(previous.wreck, current.wreck, _WRECK_RESOURCES),
+            colony=_deltas(previous.colony, current.colony, _COLONY_RESOURCES),
+            players=players or None,
+        )
+
+
+def encode_game(game: GameSum) -> GameLog:
+    encoder = GameLogEncoder(game.initial_state)
+    return GameLog(
+        initial_state=game.initial_state,
+        days=[encoder.encode(day) for day in game.days],
+    )
+
+
+def decode_game_log(game_log: GameLog) -> GameSum:
+    """Reference decoder, rebuilds every day from the previous one"""
+    previous = game_log.initial_state
+    days: List[DaySum] = []
+
+    for delta in game_log.days:
+        player_deltas = {p.number: p for p in delta.players or []}
+        world_update = _apply(previous.world, delta.world, _WORLD_RESOURCES)
+        if delta.weather is not None:
+            world_update["weather"] = delta.weather
+        colony_update = _apply(previous.colony, delta.colony, _COLONY_RESOURCES)
+        colony_update["players"] = [
+            _apply_player(p, player_deltas.get(p.number))
+            for p in previous.colony.players
+        ]
+
+        state = GameStateSum(
+            world=previous.world.model_copy(update=world_update),
+            wreck=previous.wreck.model_copy(
+                update=_apply(previous.wreck, delta.wreck, _WRECK_RESOURCES)
+            ),
+            colony=previous.colony.model_copy(update=colony_update),
+        )
+        days.append(DaySum(day=delta.day, actions=delta.actions, night_state=state))
+        previous = state
+
+    return GameSum(initial_state=game_log.initial_state, days=days)
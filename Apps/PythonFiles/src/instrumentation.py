@@ -0,0 +1,109 @@
+"""
+Instrumentation of the game engine
+
+When GameEngineParams.instrument is set, each day records the wall time of its phases,
+the amount of decisions and of forward passes in the neural network.
+The measures are returned in the GameSum, and added to process-wide counters exposed in the Prometheus text format.
+Nothing is measured otherwise.
+"""
+
+import threading
+import time
+from typing import Dict, List
+from pydantic import BaseModel as PBaseModel
+
+# Phases of a day, in order
+PHASES = ["world_update", "actions", "deaths", "dining", "leaving", "summary"]
+
+
+class DayMetricsSum(PBaseModel):
+    day: int
+    # Wall time of each phase, in seconds
+    phases: Dict[str, float]
+    decisions: int
+    forward_calls: int
+
+
+class GameMetricsSum(PBaseModel):
+    phases: Dict[str, float]
+    decisions: int
+    forward_calls: int
+    days: List[DayMetricsSum]
+
+    @classmethod
+    def from_days(cls, days: List[DayMetricsSum]):
+        return cls(
+            phases={p: sum(d.phases.get(p, 0) for d in days) for p in PHASES},
+            decisions=sum(d.decisions for d in days),
+            forward_calls=sum(d.forward_calls for d in days),
+            days=days,
+        )
+
+
+class PhaseTimer:
+    """Measures the phases of a day one after the other, each lap ending a phase"""
+
+    def __init__(self):
+        self._last = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.decisions = 0
+        self.forward_calls = 0
+
+    def lap(self, phase: str):
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0) + now - self._last
+        self._last = now
+
+    def summarize(self, day: int) -> DayMetricsSum:
+        return DayMetricsSum(
+            day=day,
+            phases=self.phases,
+            decisions=self.decisions,
+            forward_calls=self.forward_calls,
+        )
+
+
+class _MetricsRegistry:
+    """Counters of every instrumented day played by the process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._days = 0
+        self._phases = {p: 0.0 for p in PHASES}
+        self._decisions = 0
+        self._forward_calls = 0
+
+    def record(self, day: DayMetricsSum):
+        with self._lock:
+            self._days += 1
+            for phase, seconds in day.phases.items():
+                self._phases[phase] = self._phases.get(phase, 0) + seconds
+            self._decisions += day.decisions
+            self._forward_calls += day.forward_calls
+
+    def exposition(self) -> List[str]:
+        """Returns the counters as lines of the Prometheus text format"""
+        with self._lock:
+            lines = [
+                "# HELP tcalamer_days_total Instrumented days played",
+                "# TYPE tcalamer_days_total counter",
+                f"tcalamer_days_total {self._days}",
+                "# HELP tcalamer_phase_seconds_total Wall time spent in each phase of the instrumented days",
+                "# TYPE tcalamer_phase_seconds_total counter",
+            ]
+            lines += [
+                f'tcalamer_phase_seconds_total{{phase="{phase}"}} {seconds}'
+                for phase, seconds in self._phases.items()
+            ]
+            lines += [
+                "# HELP tcalamer_decisions_total Actions chosen by the players of the instrumented days",
+                "# TYPE tcalamer_decisions_total counter",
+                f"tcalamer_decisions_total {self._decisions}",
+                "# HELP tcalamer_forward_calls_total Forward passes in the neural network of the instrumented days",
+                "# TYPE tcalamer_forward_calls_total counter",
+                f"tcalamer_forward_calls_total {self._forward_calls}",
+            ]
+            return lines
+
+
+metrics_registry = _MetricsRegistry()
@@ -0,0 +1,150 @@
+"""
+Background jobs
+
+Long trainings and tests are submitted as jobs, and their ID is returned right away.
+Jobs are run by a bounded pool of threads, so that they can't take every thread serving the games.
+Their progress is kept up to date by the callbacks of BrainTrainer.train and evaluate,
+and a cancelled job stops at the end of its current iteration.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import Callable, List, Optional, Union
+from pydantic import BaseModel as PBaseModel
+
+from .progress import ProgressSum, ProgressCallback, TrainingSum, TestSum
+
+
+class JobStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class JobSum(PBaseModel):
+    job_id: str
+    kind: str
+    status: JobStatus
+    progress: Optional[ProgressSum] = None
+    result: Optional[Union[TrainingSum, TestSum]] = None
+    error: Optional[str] = None
+    submitted_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in [JobStatus.DONE, JobStatus.FAILED, JobStatus.CANCELLED]
+
+
+class TooManyJobs(Exception):
+    """Raised when submitting a job while the maximum amount of unfinished jobs is reached"""
+
+
+# Work of a job, called with the progress callback and the cancellation event
+JobFunction = Callable[[ProgressCallback, threading.Event], PBaseModel]
+
+
+class _Job:
+    def __init__(self, kind: str):
+        self.summary = JobSum(
+            job_id=uuid.uuid4().hex,
+            kind=kind,
+            status=JobStatus.PENDING,
+            submitted_at=time.time(),
+        )
+        self.stop = threading.Event()
+
+
+class JobManager:
+    def __init__(
+        self, max_running: int = 1, max_unfinished: int = 4, history: int = 100
+    ):
+        """
+        :param max_running: Amount of jobs run at the same time, the others wait for their turn
+        :param max_unfinished: Amount of running and waiting jobs above which submissions are refused
+        :param history: Amount of finished jobs kept to be polled
+        """
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_running, thread_name_prefix="job"
+        )
+        self._max_unfinished = max_unfinished
+        self._history = history
+        self._jobs: OrderedDict[str, _Job] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _run(self, job: _Job, function: JobFunction):
+        with self._lock:
+            if job.summary.status is not JobStatus.PENDING:
+                return
+            job.summary.status = JobStatus.RUNNING
+            job.summary.started_at = time.time()
+
+        def progress(progress_sum: ProgressSum):
+            with self._lock:
+                job.summary.progress = progress_sum
+
+        try:
+            result = function(progress, job.stop)
+        except Exception as e:
+            status, result, error = JobStatus.FAILED, None, f"{type(e).__name__}: {e}"
+        else:
+            status = JobStatus.CANCELLED if job.stop.is_set() else JobStatus.DONE
+            error = None
+
+        with self._lock:
+            job.summary.status = status
+            job.summary.result = result
+            job.summary.error = error
+            job.summary.finished_at = time.time()
+
+    def _forget_finished(self):
+        """Drops the oldest finished jobs beyond the history, lock held"""
+        finished = [i for i, job in self._jobs.items() if job.summary.finished]
+        for job_id in finished[: max(0, len(finished) - self._history)]:
+            del self._jobs[job_id]
+
+    def submit(self, kind: str, function: JobFunction) -> JobSum:
+        """:raises TooManyJobs:"""
+        job = _Job(kind)
+        with self._lock:
+            unfinished = sum(not j.summary.finished for j in self._jobs.values())
+            if unfinished >= self._max_unfinished:
+                raise TooManyJobs(f"{unfinished} jobs are already waiting or running")
+            self._forget_finished()
+            self._jobs[job.summary.job_id] = job
+            summary = job.summary.model_copy()
+
+        self._executor.submit(self._run, job, function)
+        return summary
+
+    def get(self, job_id: str) -> JobSum:
+        """:raises KeyError:"""
+        with self._lock:
+            return self._jobs[job_id].summary.model_copy()
+
+    def jobs(self) -> List[JobSum]:
+        with self._lock:
+            return [job.summary.model_copy() for job in self._jobs.values()]
+
+    def cancel(self, job_id: str) -> JobSum:
+        """
+        A waiting job is cancelled right away, a running one stops at the end of its current iteration
+        :raises KeyError:
+        """
+        with self._lock:
+            job = self._jobs[job_id]
+            job.stop.set()
+            if job.summary.status is JobStatus.PENDING:
+                job.summary.status = JobStatus.CANCELLED
+                job.summary.finished_at = time.time()
+            return job.summary.model_copy()
+
+
+job_manager = JobManager()
@@ -1,9 +1,14 @@
-from typing import Any, TypeVar
+from typing import Any, List, Type, TypeVar
 
 
 class Object:
     """Abstract class to define every game items"""
 
+    __slots__ = ()
+
+    # Bit of the item in the inventories of the players, see ITEM_CLASSES
+    bit: int = 0
+
     def use(self, *args, **kwargs) -> Any:
         """Defines the action when using an object"""
 
@@ -14,13 +19,27 @@ class Object:
 class Bucket(Object):
     """Increase the amount of water fetched"""
 
+    __slots__ = ()
+
 
 class Axe(Object):
     """Increase the amount of wood fetched"""
 
+    __slots__ = ()
+
 
 class FishingRod(Object):
     """Increase the amount of food fetched"""
 
+    __slots__ = ()
+
 
 T = TypeVar("T", bound=Object)
+
+"""
+Items a player can hold, at most one of each
+An inventory is an integer whose bits are the bits of the items held
+"""
+ITEM_CLASSES: List[Type[Object]] = [Bucket, Axe, FishingRod]
+for _index, _item_class in enumerate(ITEM_CLASSES):
+    _item_class.bit = 1 << _index
@@ -1,14 +1,15 @@
 import random
 import math
-from typing import List, Callable, Type, Optional
+from typing import List, Type, Optional
 from enum import IntEnum
-from pydantic import BaseModel as PBaseModel, FilePath
+from pydantic import BaseModel as PBaseModel
+import numpy as np
 
 from .base_model import BaseModel
 from .actions import ActionRegistry
 from .world import ResourceEmpty
-from .objects import Object, Bucket, Axe, FishingRod, T
-from .brain import Brain, NNInputs
+from .objects import ITEM_CLASSES, Object, Bucket, Axe, FishingRod, T
+from .brain import Brain, colony_vision
 
 _daily_actions = ActionRegistry()
 
@@ -33,35 +34,61 @@ class Player(BaseModel):
     A player is defined by a _number (names ar for humans)
     He lives in a _colony and can add some resources to it.
     He also has objects in its _inventory to enhance his _actions
+
+    Colonies can hold thousands of players, their attributes are slots and their inventory a bitmask
     """
 
+    __slots__ = (
+        "_number",
+        "_rng",
+        "_colony",
+        "_world",
+        "_state",
+        "_inventory",
+        "_day_of_death",
+        "_brain",
+        "_training_enable",
+        "_trainer",
+        "nn_vision_before_action",
+        "nn_vision_after_action",
+        "nn_action_taken",
+        "nn_fitness_before_action",
+        "nn_fitness_after_action",
+    )
+
     def __init__(
         self,
         number: int,
         colony,
-        brain_location: Optional[FilePath] = None,
+        brain: Optional[Brain] = None,
         training: bool = False,
         trainer=None,
+        rng: Optional[random.Random] = None,
     ):
+        """
+        :param brain: Brain choosing the actions of make_best_daily_action, usually shared by the colony.
+            Not needed when training, nor when the actions are chosen elsewhere
+        """
         if training and not trainer:
             raise ValueError("Please, give a trainer to enable training")
 
         self._number = number
+        self._rng = rng or random.Random()
         self._colony = colony
         self._world = colony._world  # noqa
         self._state = PlayerState.ALIVE
-        self._inventory: List[Object] = []
-        self._actions: List[Callable] = []
+        # Bits of the items held, see ITEM_CLASSES
+        self._inventory = 0
 
         self._day_of_death = -1  # initialize purposefully with a wrong value
 
         # Brain and NN stuffs blah blah blah
         # don't set brain when training enabled, the trainer do the job
-        self._brain = Brain(brain_location) if not training else None
+        self._brain = brain if not training else None
         self._training_enable = training
         self._trainer = trainer
-        self.nn_vision_before_action: Optional[NNInputs] = None
-        self.nn_vision_after_action: Optional[NNInputs] = None
+        self.nn_vision_before_action: Optional[np.ndarray] = None
+        self.nn_vision_after_action: Optional[np.ndarray] = None
         self.nn_action_taken: Optional[int] = None
         self.nn_fitness_before_action: Optional[float] = None
         self.nn_fitness_after_action: Optional[float] = None
@@ -94,7 +121,7 @@ class Player(BaseModel):
             math.exp(wood_needs)
             + math.exp(food_needs)
             + math.exp(water_needs)
-            + math.exp(-len(self._inventory))
+            + math.exp(-self.amount_of_items)
         )
 
     @property
@@ -107,28 +134,36 @@ class Player(BaseModel):
             raise ValueError(f"{self} not dead yet")
         return self._day_of_death
 
-    def get_current_vision(self) -> NNInputs:
-        return NNInputs.from_player(self)
+    def get_current_vision(self) -> np.ndarray:
+        """Returns the inputs of the neural network, see NNInputs.from_vector to read them"""
+        return colony_vision(self._colony, [self])[0]
 
     """Items checkup"""
 
+    @property
+    def item_classes(self) -> List[Type[Object]]:
+        """Returns the classes of the items in the inventory"""
+        return [c for c in ITEM_CLASSES if self._inventory & c.bit]
+
+    @property
+    def amount_of_items(self) -> int:
+        # int.bit_count needs Python 3.10
+        return bin(self._inventory).count("1")
+
     def has_item(self, item_class: Type[T]) -> bool:
-        for o in self._inventory:
-            if isinstance(o, item_class):
-                return True
-        return False
+        return self._inventory & item_class.bit != 0
 
     @property
     def has_bucket(self) -> bool:
-        return self.has_item(Bucket)
+        return self._inventory & Bucket.bit != 0
 
     @property
     def has_axe(self) -> bool:
-        return self.has_item(Axe)
+        return self._inventory & Axe.bit != 0
 
     @property
     def has_fishing_rod(self) -> bool:
-        return self.has_item(FishingRod)
+        return self._inventory & FishingRod.bit != 0
 
     """Daily action methods
     These are the _actions that a player can do for the _colony during the daylight.
@@ -176,7 +211,8 @@ class Player(BaseModel):
         """
         new_object = self._world.search_wreck(self)
         if new_object:
-            self._inventory.append(new_object)
+            self._inventory |= new_object.bit
+            self._colony.player_item_found(self, new_object.__class__)
             return f"{self} search wreck and found {new_object}"
         return f"{self} search wreck and found nothing ..."
 
@@ -196,18 +232,24 @@ class Player(BaseModel):
     Change the state of the player
     """
 
+    def _change_state(self, state: PlayerState):
+        """Changes the state and keeps the colony counters up to date"""
+        old_state = self._state
+        self._state = state
+        self._colony.player_state_changed(self, old_state, state)
+
     def die(self, day_of_death: int):
-        self._state = PlayerState.DEAD
+        self._change_state(PlayerState.DEAD)
         self._day_of_death = day_of_death
 
     def flee(self):
-        self._state = PlayerState.ESCAPED
+        self._change_state(PlayerState.ESCAPED)
 
     def heal(self):
-        self._state = PlayerState.ALIVE
+        self._change_state(PlayerState.ALIVE)
 
     def get_sick(self):
-        self._state = PlayerState.SICK
+        self._change_state(PlayerState.SICK)
 
     """ActionSummary choice
     The player should choose its _actions with the following methods
@@ -220,7 +262,7 @@ class Player(BaseModel):
 
     def make_random_daily_action(self) -> str:
         """Calls a random daily action"""
-        return random.choice(_daily_actions.actions).function(self)
+        return self._rng.choice(_daily_actions.actions).function(self)
 
     def make_best_daily_action(self) -> int:
         """
@@ -229,21 +271,34 @@ class Player(BaseModel):
         This updates the vision before and after the action
         :return: ID of the action chosen
         """
-        inputs = self.get_current_vision()
-        self.nn_vision_before_action = inputs
-        self.nn_fitness_before_action = self.fitness
+        inputs = self.look_before_action()
 
         if self._training_enable:
             action_id = self._trainer.choose_action(inputs)
         else:
             action_id = self._brain.chose_action(inputs)
 
+        self.make_chosen_daily_action(action_id)
+        return action_id
+
+    def look_before_action(self, vision: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Updates the vision before the action and returns it
+        The vision can be given when already computed for the whole colony
+        The action can then be chosen elsewhere, and made with make_chosen_daily_action
+        """
+        inputs = self.get_current_vision() if vision is None else vision
+        self.nn_vision_before_action = inputs
+        self.nn_fitness_before_action = self.fitness
+        return inputs
+
+    def make_chosen_daily_action(self, action_id: int):
+        """Calls the given daily action and updates the vision after the action"""
         self.nn_action_taken = action_id
         self._make_daily_action(action_id)
 
         self.nn_vision_after_action = self.get_current_vision()
         self.nn_fitness_after_action = self.fitness
-        return action_id
 
     def summarize(self) -> PlayerSum:
         return PlayerSum(
@@ -255,4 +310,4 @@ class Player(BaseModel):
         )
 
     def __str__(self):
-        return f"{self.name} ({len(self._inventory)} items)"
+        return f"{self.name} ({self.amount_of_items} items)"
@@ -0,0 +1,44 @@
+"""
+Summaries of the trainings and tests
+Kept apart from the trainer and the evaluation, so that the API reads them without importing torch or multiprocessing
+"""
+
+from typing import Callable, Optional, Tuple
+from pydantic import BaseModel as PBaseModel, FilePath
+
+
+class TrainingSum(PBaseModel):
+    brain_location: FilePath
+    games_played: int
+    updates: int
+    transitions: int
+    elapsed_time: float
+    games_per_second: float
+    updates_per_second: float
+    transitions_per_second: float
+
+
+class TestSum(PBaseModel):
+    win_ratio: float
+    win_ratio_interval: Tuple[float, float]
+    confidence: float
+    wins: int
+    losses: int
+    games_played: int
+    mean_days_survived: float
+    wall_clock_time: float
+
+
+class ProgressSum(PBaseModel):
+    """Progress of a long training or test, reported after each iteration or round"""
+
+    done: int
+    total: int
+    games_played: int
+    games_per_second: float
+    win_streak: Optional[int] = None
+    win_ratio: Optional[float] = None
+    average_reward: Optional[float] = None
+
+
+ProgressCallback = Callable[[ProgressSum], None]
@@ -0,0 +1,102 @@
+"""
+Torch side of the brain
+
+Only the training and the torch inference backend import this module, the games being played with NumPy.
+
+The weights of brains saved before being played with NumPy can be exported, from PythonFiles/, with
+>>> python -m src.q_network brains/trained_q_network.pth
+"""
+
+import argparse
+import os
+import warnings
+from typing import Dict
+import numpy as np
+import torch
+from torch import nn
+
+from .brain import (
+    SOURCE_KEY,
+    amount_of_inputs,
+    amount_of_outputs,
+    file_sha256,
+    hidden_size,
+    weights_location,
+)
+
+
+def limit_inference_threads():
+    """
+    Called by the processes playing the games with torch, not by the trainings
+    Each thread running a brain would otherwise use as many torch threads as cores.
+    A single thread is the fastest for such a small network, more can be given with TORCH_NUM_THREADS
+    """
+    torch.set_num_threads(int(os.environ.get("TORCH_NUM_THREADS", 1)))
+
+
+class _QNetwork(nn.Module):
+    """Simple Q-Network"""
+
+    def __init__(self, input_size: int, output_size: int):
+        super(_QNetwork, self).__init__()
+
+        # Adds two fully-connected layers
+        self.fc1 = nn.Linear(input_size, hidden_size)
+        self.fc2 = nn.Linear(hidden_size, output_size)
+
+    def forward(self, x):
+        x = torch.relu(self.fc1(x))
+        return self.fc2(x)
+
+
+def freeze(q_network: _QNetwork) -> torch.jit.ScriptModule:
+    """
+    Compiles the network with TorchScript, its weights being folded in as constants
+    The frozen network only runs inference, with less overhead per call than the eager module
+    """
+    with warnings.catch_warnings():
+        # Recent versions of torch advise torch.compile, which compiles far too long for such a small network
+        warnings.simplefilter("ignore", FutureWarning)
+        return torch.jit.freeze(torch.jit.script(q_network.eval()))
+
+
+class TorchQNetwork:
+    """Frozen network loaded from a brain file, called with NumPy arrays like the NumPy backend"""
+
+    def __init__(self, location: str):
+        q_network = _QNetwork(
+            input_size=amount_of_inputs, output_size=amount_of_outputs
+        )
+        q_network.load_state_dict(torch.load(location))
+        self._frozen = freeze(q_network)
+
+    def __call__(self, inputs: np.ndarray) -> np.ndarray:
+        with torch.inference_mode():
+            return self._frozen(torch.from_numpy(inputs)).numpy()
+
+
+def export_weights(state_dict: Dict[str, torch.Tensor], location: str):
+    """
+    Writes the weights as NumPy arrays next to the brain file, to be played without torch
+    They're tied to the content of the brain file, which must be saved first
+    """
+    np.savez(
+        weights_location(location),
+        **{name: tensor.detach().cpu().numpy() for name, tensor in state_dict.items()},
+        **{SOURCE_KEY: np.array(file_sha256(location))},
+    )
+
+
+def save_brain(state_dict: Dict[str, torch.Tensor], location: str):
+    """Saves the brain for the training, and its weights for the games"""
+    torch.save(state_dict, location)
+    export_weights(state_dict, location)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Exports the weights of brains, to be played without torch"
+    )
+    parser.add_argument("locations", nargs="+", help="Brain files")
+    for brain_location in parser.parse_args().locations:
+        export_weights(torch.load(brain_location), brain_location)
@@ -0,0 +1,71 @@
+from typing import Tuple
+import numpy as np
+
+
+class ReplayBuffer:
+    """
+    Ring buffer of transitions used to train the brain with mini-batches
+    Transitions are stored in preallocated arrays, the oldest ones being overwritten once full
+    """
+
+    def __init__(self, capacity: int, input_size: int):
+        if capacity <= 0:
+            raise ValueError("Capacity should be positive")
+
+        self._capacity = capacity
+        self._states = np.zeros((capacity, input_size), dtype=np.float32)
+        self._actions = np.zeros(capacity, dtype=np.int64)
+        self._rewards = np.zeros(capacity, dtype=np.float32)
+        self._next_states = np.zeros((capacity, input_size), dtype=np.float32)
+        self._dones = np.zeros(capacity, dtype=bool)
+
+        self._position = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def push(
+        self,
+        states: np.ndarray,
+        actions: np.ndarray,
+        rewards: np.ndarray,
+        next_states: np.ndarray,
+        dones: np.ndarray,
+    ):
+        """Adds a batch of transitions, one row per transition"""
+        amount = len(actions)
+        if amount > self._capacity:
+            # Only the most recent transitions would be kept anyway
+            states, actions, rewards, next_states, dones = (
+                a[-self._capacity :]
+                for a in (states, actions, rewards, next_states, dones)
+            )
+            amount = self._capacity
+
+        indexes = (self._position + np.arange(amount)) % self._capacity
+        self._states[indexes] = states
+        self._actions[indexes] = actions
+        self._rewards[indexes] = rewards
+        self._next_states[indexes] = next_states
+        self._dones[indexes] = dones
+
+        self._position = (self._position + amount) % self._capacity
+        self._size = min(self._size + amount, self._capacity)
+
+    def sample(
+        self, batch_size: int, rng: np.random.Generator
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Returns random transitions as (states, actions, rewards, next_states, dones)"""
+        indexes = rng.integers(0, self._size, batch_size)
+        return (
+            self._states[indexes],
+            self._actions[indexes],
+            self._rewards[indexes],
+            self._next_states[indexes],
+            self._dones[indexes],
+        )
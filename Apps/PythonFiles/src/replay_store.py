@@ -0,0 +1,183 @@
+"""
+Storage of the played games
+
+A seeded game is fully described by its parameters and the brain it was played with.
+The store only saves these, with the CACHE_VERSION of the engine, and rebuilds the GameSum or a single DaySum by playing the game again.
+The most recently replayed games are kept in memory for the viewer.
+A game stored by another version of the engine would play differently, it is refused instead.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+from pydantic import BaseModel as PBaseModel
+
+from .brain import brain_registry
+from .game_engine import GameEngine, GameEngineParams, GameSum, DaySum
+from .result_cache import CACHE_VERSION
+from .seeding import SeedStream
+
+
+class ReplayParams(GameEngineParams):
+    """The stored parameters, their brain file being allowed to disappear once the game is stored"""
+
+    brain_location: Optional[str] = GameEngineParams.model_fields[
+        "brain_location"
+    ].default
+
+
+class ReplaySum(PBaseModel):
+    game_id: str
+    # The games stored before the version was saved have none
+    version: Optional[int] = None
+    ge_params: ReplayParams
+    brain_hash: Optional[str]
+    days: int
+    victory: bool
+
+
+class ReplayStore:
+    """Saves the games as ReplaySum files in the given directory, one per game"""
+
+    def __init__(self, directory: str = "replays", cache_size: int = 16):
+        """
+        :param cache_size: Amount of replayed games kept in memory
+        """
+        self._directory = directory
+        self._cache_size = cache_size
+        self._games: OrderedDict[str, GameSum] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, game_id: str) -> str:
+        return os.path.join(self._directory, f"{game_id}.json")
+
+    @staticmethod
+    def _play(ge_params: GameEngineParams) -> GameSum:
+        stream = GameEngine(ge_params).stream()
+        return GameSum(initial_state=next(stream), days=list(stream))
+
+    def _cache(self, game_id: str, game: GameSum):
+        with self._lock:
+            self._games[game_id] = game
+            self._games.move_to_end(game_id)
+            while len(self._games) > self._cache_size:
+                self._games.popitem(last=False)
+
+    def _cached(self, game_id: str) -> Optional[GameSum]:
+        with self._lock:
+            game = self._games.get(game_id)
+            if game is not None:
+                self._games.move_to_end(game_id)
+            return game
+
+    def record(self, ge_params: GameEngineParams) -> ReplaySum:
+        """
+        Plays the game and saves it, a seed being drawn when none is given
+        The game is the same for the same parameters and brain, and then has the same ID
+        """
+        if ge_params.training:
+            raise ValueError("Training games can't be replayed")
+        if ge_params.seed is None:
+            ge_params = ge_params.model_copy(update={"seed": SeedStream().next()})
+        brain_hash = brain_registry.fingerprint(ge_params.brain_location)
+
+        game_id = hashlib.sha256(
+            f"{CACHE_VERSION}{ge_params.model_dump_json()}{brain_hash}".encode()
+        ).hexdigest()[:16]
+
+        game = self._cached(game_id) or self._play(ge_params)
+        self._cache(game_id, game)
+        last_state = game.days[-1].night_state if game.days else game.initial_state
+
+        replay = ReplaySum(
+            game_id=game_id,
+            version=CACHE_VERSION,
+            ge_params=ReplayParams.model_validate(ge_params.model_dump(mode="json")),
+            brain_hash=brain_hash,
+            days=len(game.days),
+            # Once the game is over, the players still alive are the ones who left
+            victory=any(p.alive for p in last_state.colony.players),
+        )
+
+        # Written atomically, a concurrent reader never sees a partial file
+        os.makedirs(self._directory, exist_ok=True)
+        temporary_path = f"{self._path(game_id)}.tmp"
+        with open(temporary_path, "w") as file:
+            file.write(replay.model_dump_json())
+        os.replace(temporary_path, self._path(game_id))
+
+        return replay
+
+    def get(self, game_id: str) -> ReplaySum:
+        """:raises KeyError: when the game isn't stored"""
+        try:
+            with open(self._path(game_id)) as file:
+                return ReplaySum.model_validate_json(file.read())
+        except FileNotFoundError:
+            raise KeyError(game_id)
+
+    def game_ids(self) -> List[str]:
+        if not os.path.isdir(self._directory):
+            return []
+        return sorted(
+            name[: -len(".json")]
+            for name in os.listdir(self._directory)
+            if name.endswith(".json")
+        )
+
+    def _checked_params(self, replay: ReplaySum) -> GameEngineParams:
+        """:raises ValueError: when the engine or the brain file changed, or the brain disappeared, since the game was played"""
+        if replay.version != CACHE_VERSION:
+            raise ValueError(
+                f"Game {replay.game_id} was played by another version of the engine, it can't be replayed"
+            )
+        location = replay.ge_params.brain_location
+        if replay.brain_hash is not None and not (
+            location and os.path.isfile(location)
+        ):
+            raise ValueError(
+                f"The brain {location} of game {replay.game_id} doesn't exist anymore, it can't be replayed"
+            )
+        if brain_registry.fingerprint(replay.ge_params.brain_location) != (
+            replay.brain_hash
+        ):
+            raise ValueError(
+                f"The brain of game {replay.game_id} changed, it can't be replayed"
+            )
+        return GameEngineParams.model_validate(replay.ge_params.model_dump())
+
+    def game(self, game_id: str) -> GameSum:
+        """
+        Returns the whole game, played again unless recently replayed
+        :raises KeyError: when the game isn't stored
+        :raises ValueError: when the engine or the brain changed
+        """
+        game = self._cached(game_id)
+        if game is None:
+            game = self._play(self._checked_params(self.get(game_id)))
+            self._cache(game_id, game)
+        return game
+
+    def day(self, game_id: str, day: int) -> DaySum:
+        """
+        Returns a single day of the game
+        Unless the game was recently replayed, the days before are played without being summarized
+        :raises KeyError: when the game isn't stored
+        :raises IndexError: when the game has no such day
+        :raises ValueError: when the engine or the brain changed
+        """
+        game = self._cached(game_id)
+        if game is not None:
+            if not 1 <= day <= len(game.days):
+                raise IndexError(f"Game {game_id} has no day #{day}")
+            return game.days[day - 1]
+
+        replay = self.get(game_id)
+        if not 1 <= day <= replay.days:
+            raise IndexError(f"Game {game_id} has no day #{day}")
+        return GameEngine(self._checked_params(replay)).seek(day)
+
+
+replay_store = ReplayStore()
@@ -0,0 +1,148 @@
+"""
+Cache of the results of the seeded games
+
+A seeded game only depends on its parameters and on the content of the brain file.
+Results are keyed by a hash of both, so that a brain file changing never hits the results of the previous one.
+The key also holds CACHE_VERSION, to be bumped by every change of the games results for a given seed.
+Results are kept in memory up to a given amount, the least recently used ones being dropped,
+and can also be written to a directory shared between restarts.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Type, TypeVar
+from pydantic import BaseModel as PBaseModel
+
+from .brain import brain_registry
+from .game_engine import GameEngineParams
+
+T = TypeVar("T", bound=PBaseModel)
+
+# Bumped when the results of seeded games change, the results written by previous versions being missed
+CACHE_VERSION = 2
+
+
+class CacheSum(PBaseModel):
+    memory_hits: int
+    disk_hits: int
+    misses: int
+    size: int
+    capacity: int
+    directory: Optional[str]
+
+
+class ResultCache:
+    def __init__(self, capacity: int = 64, directory: Optional[str] = None):
+        """
+        :param capacity: Amount of results kept in memory
+        :param directory: When given, results are also written there and read back on memory misses
+        """
+        self._capacity = capacity
+        self._directory = directory
+        self._results: OrderedDict[str, PBaseModel] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def key(endpoint: str, ge_params: GameEngineParams, **options) -> Optional[str]:
+        """
+        Returns the key of the result, None when the games aren't seeded and can't be cached
+        Instrumented games aren't cached either, their measures changing every time
+        :param options: Other parameters changing the result, the seed of the games among them
+        """
+        seed = options.get("seed", ge_params.seed)
+        if seed is None or ge_params.instrument:
+            return None
+
+        # The brain is identified by its content, not its location
+        params = ge_params.model_dump(
+            mode="json", exclude={"print_game", "brain_location", "brain_trainer"}
+        )
+        canonical = json.dumps(
+            {
+                "version": CACHE_VERSION,
+                "endpoint": endpoint,
+                "params": params,
+                "brain": brain_registry.fingerprint(ge_params.brain_location),
+                "options": options,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, f"{key}.json")
+
+    def _remember(self, key: str, result: PBaseModel):
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self._capacity:
+                self._results.popitem(last=False)
+
+    def get(self, key: Optional[str], model: Type[T]) -> Optional[T]:
+        """Returns the cached result, None on a miss"""
+        if key is None:
+            return None
+
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+                self._memory_hits += 1
+                return result
+
+        if self._directory is not None:
+            try:
+                with open(self._path(key)) as file:
+                    result = model.model_validate_json(file.read())
+            except FileNotFoundError:
+                ...
+            else:
+                self._remember(key, result)
+                with self._lock:
+                    self._disk_hits += 1
+                return result
+
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def put(self, key: Optional[str], result: PBaseModel):
+        if key is None:
+            return
+
+        self._remember(key, result)
+        if self._directory is not None:
+            # Written atomically, a concurrent reader never sees a partial file
+            os.makedirs(self._directory, exist_ok=True)
+            temporary_path = f"{self._path(key)}.{threading.get_ident()}.tmp"
+            with open(temporary_path, "w") as file:
+                file.write(result.model_dump_json())
+            os.replace(temporary_path, self._path(key))
+
+    def clear(self):
+        """Forget the results kept in memory and reset the counters, the directory is kept"""
+        with self._lock:
+            self._results.clear()
+            self._memory_hits = self._disk_hits = self._misses = 0
+
+    def summarize(self) -> CacheSum:
+        with self._lock:
+            return CacheSum(
+                memory_hits=self._memory_hits,
+                disk_hits=self._disk_hits,
+                misses=self._misses,
+                size=len(self._results),
+                capacity=self._capacity,
+                directory=self._directory,
+            )
+
+
+result_cache = ResultCache(directory=os.environ.get("RESULT_CACHE_DIRECTORY"))
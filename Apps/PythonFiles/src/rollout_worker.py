@@ -0,0 +1,99 @@
+"""
+Rollout workers of the parallel training
+
+Each worker runs in its own process and plays games with a local copy of the Q-Network.
+The transitions of each game are streamed to the learner, which periodically sends back the new weights.
+"""
+
+import queue
+import random
+import traceback
+from multiprocessing import Queue, Event
+from typing import Dict
+import numpy as np
+import torch
+
+from .game_engine import GameEngine, GameEngineParams
+from .brain import amount_of_inputs, amount_of_outputs
+from .q_network import _QNetwork
+from .seeding import SeedStream
+
+
+def _latest_weights(weights: Queue):
+    """Drains the queue of weights and returns the most recent ones, if any"""
+    latest = None
+    try:
+        while True:
+            latest = weights.get_nowait()
+    except queue.Empty:
+        return latest
+
+
+class RolloutWorkerError(Exception):
+    """Raised by the learner when a rollout worker failed, with the traceback of the worker"""
+
+
+def rollout_worker(
+    ge_params: GameEngineParams,
+    greedy_epsilon: float,
+    seed: int,
+    weights: Queue,
+    transitions: Queue,
+    stop: Event,
+):
+    """
+    Plays games until stopped, sending the transitions of each game to the learner as
+    (states, actions, rewards, next_states, dones, won)
+    When failing, a RolloutWorkerError is sent instead
+    :param seed: Seed of the worker, each game taking the next seed of its stream
+    """
+    try:
+        _play(ge_params, greedy_epsilon, seed, weights, transitions, stop)
+    except Exception:
+        transitions.put(RolloutWorkerError(traceback.format_exc()))
+        raise
+
+
+def _play(
+    ge_params: GameEngineParams,
+    greedy_epsilon: float,
+    seed: int,
+    weights: Queue,
+    transitions: Queue,
+    stop: Event,
+):
+    # Imported here as the trainer imports this module
+    from .brain_trainer import BrainTrainer, EpsilonGreedyPolicy
+
+    # The learner has its own cores
+    torch.set_num_threads(1)
+
+    q_network = _QNetwork(input_size=amount_of_inputs, output_size=amount_of_outputs)
+    q_network.eval()
+    ge_params.training = True
+    seeds = SeedStream(seed)
+    ge_params.brain_trainer = EpsilonGreedyPolicy(
+        q_network, greedy_epsilon, random.Random(seeds.next())
+    )
+
+    while not stop.is_set():
+        state_dict: Dict[str, np.ndarray] = _latest_weights(weights)
+        if state_dict is not None:
+            q_network.load_state_dict(
+                {k: torch.from_numpy(v) for k, v in state_dict.items()}
+            )
+
+        ge = GameEngine(ge_params.model_copy(update={"seed": seeds.next()}))
+        days = []
+        while ge.run_single() is not None:
+            days.append(BrainTrainer.collect_transitions(ge))
+
+        game = tuple(np.concatenate(columns) for columns in zip(*days)) + (
+            ge.colony.at_least_one_left_the_isle,
+        )
+        while not stop.is_set():
+            try:
+                transitions.put(game, timeout=0.1)
+                break
+            except queue.Full:
+                ...
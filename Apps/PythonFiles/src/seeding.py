@@ -0,0 +1,34 @@
+"""
+Seeds of the random generators
+
+Every game engine draws from its own random generator, seeded from GameEngineParams.seed.
+Parallel shards and training games take their seeds from a SeedStream, whose children are independent.
+"""
+
+from typing import List, Optional, Tuple
+import numpy as np
+
+
+class SeedStream:
+    """Infinite stream of independent seeds, derived from a root seed"""
+
+    def __init__(self, seed: Optional[int] = None, spawned: int = 0):
+        """
+        :param seed: Root seed, fresh entropy is used when None
+        :param spawned: Amount of seeds already taken from this stream, to resume it
+        """
+        self._sequence = np.random.SeedSequence(seed, n_children_spawned=spawned)
+
+    @property
+    def state(self) -> Tuple[int, int]:
+        """Returns the root seed and the amount of seeds taken, to save the stream"""
+        return self._sequence.entropy, self._sequence.n_children_spawned
+
+    def next(self) -> int:
+        return self.spawn(1)[0]
+
+    def spawn(self, amount: int) -> List[int]:
+        return [
+            int(child.generate_state(1, np.uint64)[0])
+            for child in self._sequence.spawn(amount)
+        ]
@@ -0,0 +1,380 @@
+"""
+Lockstep simulation of many games at once
+
+The VectorGameEngine follows the rules of the GameEngine, but every game is stored as NumPy arrays
+instead of World, Colony, Player and Wreck objects : resources and weather per game,
+states and inventories per player. Every game advances of one day per step,
+and the decisions of every alive player of every game are made with a single pass in the neural network.
+
+The players choose their actions from the dawn state, like the batched decisions of the GameEngine.
+"""
+
+import random
+from dataclasses import dataclass
+from typing import Optional
+import numpy as np
+
+from .game_engine import GameEngineParams
+from .player import PlayerState
+from .world import Weather
+from .brain import Brain, amount_of_inputs
+from .objects import Bucket, Axe, FishingRod
+
+# Resources and tools share the index of the action fetching the resource
+WATER, WOOD, FOOD = 0, 1, 2
+SEARCH_WRECK = 3
+BUCKET, AXE, FISHING_ROD = WATER, WOOD, FOOD
+TOOL_BITS = np.array([Bucket.bit, Axe.bit, FishingRod.bit], dtype=np.uint8)
+
+
+@dataclass
+class VectorDay:
+    """
+    The actions made by the alive players of every game during the last day
+    Players are given by their game index and player number
+    """
+
+    games: np.ndarray
+    players: np.ndarray
+    vision_before_action: np.ndarray
+    actions: np.ndarray
+    # The following are only filled when the transitions are recorded
+    vision_after_action: Optional[np.ndarray] = None
+    fitness_after_action: Optional[np.ndarray] = None
+    state_at_night: Optional[np.ndarray] = None
+
+
+class VectorGameEngine:
+    """Runs amount_of_games games with the given parameters, one day at a time for every game"""
+
+    def __init__(
+        self,
+        ge_params: GameEngineParams,
+        amount_of_games: int,
+        record_transitions: bool = False,
+        seed: Optional[int] = None,
+    ):
+        games, players = amount_of_games, ge_params.number_of_players
+        self._rng = np.random.default_rng(ge_params.seed if seed is None else seed)
+        self._record_transitions = record_transitions
+
+        # Wreck, item sets are listed until found empty, as in Wreck.search
+        self._wreck_probability = ge_params.wreck_probability
+        self._wreck_items = np.tile(
+            np.array(
+                [
+                    ge_params.bucket_amount,
+                    ge_params.axe_amount,
+                    ge_params.fishing_rod_amount,
+                ],
+                dtype=np.int64,
+            ),
+            (games, 1),
+        )
+        self._wreck_listed = np.ones((games, 3), dtype=bool)
+        self._wreck_fetched = np.zeros(games, dtype=np.int64)
+        self._wreck_failed = np.zeros(games, dtype=np.int64)
+
+        # World
+        self._weather = np.full(games, int(ge_params.default_weather), dtype=np.int64)
+        self._world = np.tile(
+            np.array(
+                [
+                    ge_params.initial_water_level,
+                    ge_params.initial_wood_amount,
+                    ge_params.initial_food_amount,
+                ],
+                dtype=np.int64,
+            ),
+            (games, 1),
+        )
+        basic_fetch_factors = [
+            np.array(ge_params.basic_water_fetch_factor or [1, 2, 3]),
+            np.array(ge_params.basic_wood_fetch_factor or [1, 2, 3]),
+            np.array(ge_params.basic_food_fetch_factor or [1, 2, 3]),
+        ]
+        self._fetch_factors = basic_fetch_factors
+        # Same as World : the food fetch factor is doubled from the wood one when cloudy
+        self._boosted_fetch_factors = [
+            2 * basic_fetch_factors[WATER],
+            2 * basic_fetch_factors[WOOD],
+            2 * basic_fetch_factors[WOOD],
+        ]
+        self._boosting_weathers = [Weather.RAINING, Weather.STORM, Weather.CLOUDY]
+
+        # Colony, each player brings resources to live one day
+        self._colony = np.zeros((games, 3), dtype=np.int64)
+        self._colony[:, WATER] = players * ge_params.initial_water_surviving_factor
+        self._colony[:, FOOD] = players * ge_params.initial_food_surviving_factor
+        self._amount_to_leave = np.array(
+            [
+                ge_params.amount_of_water_per_player_to_leave,
+                ge_params.amount_of_wood_per_player_to_leave,
+                ge_params.amount_of_food_per_player_to_leave,
+            ],
+            dtype=np.int64,
+        )
+        # Water and food objectives keep one more day of resources, see Colony
+        self._objective_factors = self._amount_to_leave + np.array([1, 0, 1])
+
+        # Players
+        self._states = np.full((games, players), int(PlayerState.ALIVE), np.int8)
+        self._inventory = np.zeros((games, players), dtype=np.uint8)
+        self._day_of_death = np.full((games, players), -1, dtype=np.int64)
+
+        # Decisions
+        if ge_params.training:
+            self._decision_maker = ge_params.brain_trainer
+        else:
+            self._decision_maker = Brain(
+                ge_params.brain_location,
+                random.Random(int(self._rng.integers(2**63))),
+            )
+
+        self._day = np.zeros(games, dtype=np.int64)
+        self.last_day: Optional[VectorDay] = None
+
+    """Game states"""
+
+    @property
+    def amount_of_games(self) -> int:
+        return len(self._day)
+
+    @property
+    def _alive(self) -> np.ndarray:
+        return (self._states == PlayerState.ALIVE) | (self._states == PlayerState.SICK)
+
+    @property
+    def alive_counts(self) -> np.ndarray:
+        return self._alive.sum(axis=1)
+
+    @property
+    def game_over(self) -> np.ndarray:
+        """The game is over iff every player is dead or gone"""
+        return self.alive_counts <= 0
+
+    @property
+    def all_games_over(self) -> bool:
+        return bool(self.game_over.all())
+
+    @property
+    def wins(self) -> np.ndarray:
+        """A game is won when at least one player left the isle"""
+        return (self._states == PlayerState.ESCAPED).any(axis=1)
+
+    @property
+    def days(self) -> np.ndarray:
+        """Amount of days simulated in each game"""
+        return self._day.copy()
+
+    """Vision and fitness
+    Same as colony_vision and Player.fitness, for players given by their game index and number
+    """
+
+    def _needs(self, games: np.ndarray, alive_counts: np.ndarray) -> np.ndarray:
+        """Returns the needs of the given games relatively to their objectives"""
+        objectives = alive_counts[:, None] * self._objective_factors
+        return (objectives - self._colony[games]) / objectives
+
+    def _vision(self, games: np.ndarray, players: np.ndarray) -> np.ndarray:
+        alive = self._alive
+        alive_counts = alive.sum(axis=1)[games]
+        inventory = self._inventory[games, players]
+
+        inputs = np.zeros((len(games), amount_of_inputs), dtype=np.float32)
+        inputs[np.arange(len(games)), self._weather[games]] = 1
+
+        distances = 1 - np.exp(-4 * np.clip(self._needs(games, alive_counts), 0, 1))
+        inputs[:, 4] = distances[:, FOOD]
+        inputs[:, 5] = distances[:, WATER]
+        inputs[:, 6] = distances[:, WOOD]
+
+        fetched = self._wreck_fetched[games]
+        fail_rate = np.divide(
+            self._wreck_failed[games],
+            fetched,
+            out=np.zeros(len(games)),
+            where=fetched > 0,
+        )
+        inputs[:, 7] = np.exp(-1.4 * fail_rate)
+
+        tools = (inventory[:, None] & TOOL_BITS) > 0
+        inputs[:, 8] = tools[:, AXE]
+        inputs[:, 9] = tools[:, BUCKET]
+        inputs[:, 10] = tools[:, FISHING_ROD]
+
+        # Share of the other alive players holding each tool
+        holding = (self._inventory[:, :, None] & TOOL_BITS) > 0
+        holders = (holding & alive[:, :, None]).sum(axis=1)[games]
+        others = (holders - tools) / alive_counts[:, None]
+        inputs[:, 11] = others[:, AXE]
+        inputs[:, 12] = others[:, BUCKET]
+        inputs[:, 13] = others[:, FISHING_ROD]
+
+        return inputs
+
+    def _fitness(self, games: np.ndarray, players: np.ndarray) -> np.ndarray:
+        needs = np.maximum(self._needs(games, self.alive_counts[games]), 0)
+        items = np.unpackbits(self._inventory[games, players][:, None], axis=1).sum(1)
+        return 100 / (np.exp(needs).sum(axis=1) + np.exp(-items.astype(np.float64)))
+
+    """Day steps"""
+
+    def _choose_actions(self, inputs: np.ndarray) -> np.ndarray:
+        if len(inputs) == 0:
+            return np.zeros(0, dtype=np.int64)
+        if isinstance(self._decision_maker, Brain):
+            return np.array(self._decision_maker.chose_actions(inputs), np.int64)
+        return np.array(self._decision_maker.choose_actions(inputs), np.int64)
+
+    def _fetch_resources(self, actions: np.ndarray):
+        """
+        Every player fetching a resource gets 1 or 2 (with the matching tool) times a random fetch factor
+        Players are served in order, the last ones get what remains in the world
+        """
+        for resource in [WATER, WOOD, FOOD]:
+            fetching = actions == resource
+            if not fetching.any():
+                continue
+
+            draws = self._rng.random(fetching.shape)
+            basic = self._fetch_factors[resource]
+            boosted = self._boosted_fetch_factors[resource]
+            factors = np.where(
+                (self._weather == self._boosting_weathers[resource])[:, None],
+                boosted[(draws * len(boosted)).astype(np.int64)],
+                basic[(draws * len(basic)).astype(np.int64)],
+            )
+            has_tool = (self._inventory & TOOL_BITS[resource]) > 0
+            amounts = np.where(fetching, (1 + has_tool) * factors, 0)
+
+            served_before = np.cumsum(amounts, axis=1) - amounts
+            taken = np.clip(self._world[:, resource, None] - served_before, 0, amounts)
+            total = taken.sum(axis=1)
+            self._world[:, resource] -= total
+            self._colony[:, resource] += total
+
+    def _search_wreck(self, actions: np.ndarray):
+        """
+        Same odds as Wreck.search, where finding an item already owned makes the player search again
+        The searches are made in the players order, vectorized over the games
+        """
+        probability = self._wreck_probability
+        for player in np.nonzero((actions == SEARCH_WRECK).any(axis=0))[0]:
+            games = np.nonzero(actions[:, player] == SEARCH_WRECK)[0]
+            owned = (self._inventory[games, player, None] & TOOL_BITS) > 0
+            listed = self._wreck_listed[games]
+            listed_count = listed.sum(axis=1)
+            owned_share = np.divide(
+                (listed & owned).sum(axis=1),
+                listed_count,
+                out=np.zeros(len(games)),
+                where=listed_count > 0,
+            )
+
+            # Each search finding an owned item counts as a fetch before searching again
+            retry = probability * owned_share
+            endless = retry >= 1
+            retries = np.zeros(len(games), dtype=np.int64)
+            retrying = (retry > 0) & ~endless
+            retries[retrying] = self._rng.geometric(1 - retry[retrying]) - 1
+            self._wreck_fetched[games] += 1 + retries
+
+            # Probability of finding a new item knowing the search ended
+            found_odds = np.divide(
+                probability * (1 - owned_share),
+                1 - retry,
+                out=np.zeros(len(games)),
+                where=~endless,
+            )
+            found = (self._rng.random(len(games)) < found_odds) & (listed_count > 0)
+
+            # The item set is chosen among the listed ones not owned yet
+            candidates = listed & ~owned
+            scores = np.where(candidates, self._rng.random(candidates.shape), -1)
+            item = scores.argmax(axis=1)
+            empty = self._wreck_items[games, item] <= 0
+            taken = found & ~empty
+
+            self._wreck_items[games[taken], item[taken]] -= 1
+            self._inventory[games[taken], player] |= TOOL_BITS[item[taken]]
+            emptied = found & (self._wreck_items[games, item] <= 0)
+            self._wreck_listed[games[emptied], item[emptied]] = False
+            self._wreck_failed[games[~taken]] += 1
+
+    def _kill_players(self, active: np.ndarray):
+        """Some must die when there's not enough resources for everyone"""
+        alive = self._alive & active[:, None]
+        limiting_factor = self._colony[:, [WATER, FOOD]].min(axis=1)
+        amounts_to_die = np.maximum(alive.sum(axis=1) - limiting_factor, 0)
+        if not amounts_to_die.any():
+            return
+
+        # Random players among the alive ones
+        keys = np.where(alive, self._rng.random(alive.shape), np.inf)
+        ranks = keys.argsort(axis=1).argsort(axis=1)
+        dying = alive & (ranks < amounts_to_die[:, None])
+        self._states[dying] = PlayerState.DEAD
+        self._day_of_death[dying] = self._day[np.nonzero(dying)[0]]
+
+    def _dine_and_leave(self, active: np.ndarray):
+        alive = self._alive & active[:, None]
+        alive_counts = alive.sum(axis=1)
+        self._colony[:, WATER] -= alive_counts
+        self._colony[:, FOOD] -= alive_counts
+
+        able_to_leave = (alive_counts > 0) & (
+            self._colony >= alive_counts[:, None] * self._amount_to_leave
+        ).all(axis=1)
+        self._states[alive & able_to_leave[:, None]] = PlayerState.ESCAPED
+
+    def step(self) -> VectorDay:
+        """Simulates a complete day, from dawn to dawn, of every game not over"""
+        active = ~self.game_over
+
+        # Step zero, world update
+        self._day[active] += 1
+        cloudy = self._weather == Weather.CLOUDY
+        random_weather = self._rng.integers(0, len(Weather), self.amount_of_games)
+        self._weather = np.where(
+            active,
+            np.where(cloudy, int(Weather.RAINING), random_weather),
+            self._weather,
+        )
+
+        # First step : daily actions
+        games, players = np.nonzero(self._alive & active[:, None])
+        inputs = self._vision(games, players)
+        action_ids = self._choose_actions(inputs)
+        actions = np.full(self._states.shape, -1, dtype=np.int64)
+        actions[games, players] = action_ids
+
+        self._fetch_resources(actions)
+        self._search_wreck(actions)
+
+        day = VectorDay(
+            games=games,
+            players=players,
+            vision_before_action=inputs,
+            actions=action_ids,
+        )
+        if self._record_transitions:
+            day.vision_after_action = self._vision(games, players)
+            day.fitness_after_action = self._fitness(games, players)
+
+        # Second step : Some must die
+        self._kill_players(active)
+
+        # Third and fourth steps : Diner, then verify if there's enough resources to leave
+        self._dine_and_leave(active)
+
+        if self._record_transitions:
+            day.state_at_night = self._states[games, players]
+
+        self.last_day = day
+        return day
+
+    def run(self):
+        """Runs every game until they're all over"""
+        while not self.all_games_over:
+            self.step()
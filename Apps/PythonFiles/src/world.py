@@ -1,6 +1,6 @@
 import random
 from enum import IntEnum
-from typing import Union, List
+from typing import Union, List, Optional
 from pydantic import BaseModel as PBaseModel
 
 from .base_model import BaseModel
@@ -42,7 +42,9 @@ class World(BaseModel):
         basic_wood_fetch_factor: List[int],
         basic_food_fetch_factor: List[int],
         default_weather: Weather,
+        rng: Optional[random.Random] = None,
     ):
+        self._rng = rng or random.Random()
         self._wreck = wreck
         self._weather = default_weather
 
@@ -117,7 +119,7 @@ class World(BaseModel):
     def fetch_water(self, requested_amount: int) -> int:
         if self.water_level <= 0:
             raise ResourceEmpty("No more water ...")
-        amount = requested_amount * random.choice(self._water_fetch_factor)
+        amount = requested_amount * self._rng.choice(self._water_fetch_factor)
 
         if self.water_level - amount < 0:
             amount = self.water_level
@@ -130,7 +132,7 @@ class World(BaseModel):
     def fetch_wood(self, requested_amount: int) -> int:
         if self.wood_amount <= 0:
             raise ResourceEmpty("No more wood ...")
-        amount = requested_amount * random.choice(self._wood_fetch_factor)
+        amount = requested_amount * self._rng.choice(self._wood_fetch_factor)
 
         if self.wood_amount - amount < 0:
             amount = self.wood_amount
@@ -143,7 +145,7 @@ class World(BaseModel):
     def fetch_food(self, requested_amount: int) -> int:
         if self.food_amount <= 0:
             raise ResourceEmpty("No more food ...")
-        amount = requested_amount * random.choice(self._food_fetch_factor)
+        amount = requested_amount * self._rng.choice(self._food_fetch_factor)
 
         if self.food_amount - amount < 0:
             amount = self.food_amount
@@ -161,7 +163,7 @@ class World(BaseModel):
         if self.weather is Weather.CLOUDY:
             self._weather = Weather.RAINING
         else:
-            self._weather = random.choice(list(Weather))
+            self._weather = self._rng.choice(list(Weather))
 
     def summarize(self) -> WorldSum:
         return WorldSum(
@@ -1,5 +1,6 @@
+import math
 import random
-from typing import Type, List, Union
+from typing import Type, Dict, Tuple, Union, Optional
 from pydantic import BaseModel as PBaseModel
 
 from .base_model import BaseModel
@@ -13,39 +14,25 @@ class WreckSum(PBaseModel):
     fishing_rods: int
 
 
-class _ItemSetEmpty(Exception):
-    """Raised when taking an object in an empty bucket"""
-
-
-class _ItemSet:
-    """An item set contains a single type of object in a certain quantity"""
-
-    def __init__(self, item_class: Type[T], quantity: int):
-        self.item_class = item_class
-        self.quantity = quantity
-
-    @property
-    def is_empty(self) -> bool:
-        return self.quantity <= 0
-
-    def take_item(self) -> T:
-        if self.quantity <= 0:
-            raise _ItemSetEmpty(f"ItemSet of {self.item_class.__name__} is empty")
-        self.quantity -= 1
-        return self.item_class()
-
-
 class Wreck(BaseModel):
-    """The wreck contains multiple _item_sets of objects"""
+    """
+    The wreck contains multiple sets of objects, a quantity per type of object
+    Searching it finds one of the sets with the wreck probability, and the player searches again
+    when already owning an object of this set. The searches again are drawn at once, see _search_again.
+    """
 
-    def __init__(self, probability: float):
+    def __init__(self, probability: float, rng: Optional[random.Random] = None):
         """Creates a new wreck with a certain _probability of finding objects"""
 
         if not 0 <= probability <= 1:
             raise ValueError("Probability should be between 0 and 1")
 
         self._probability = probability
-        self._item_sets: List[_ItemSet] = []
+        self._rng = rng or random.Random()
+        # Quantity of each set, removed once emptied
+        self._quantities: Dict[Type[T], int] = {}
+        # Sets in the order they were added, cached for the draws
+        self._item_classes: Optional[Tuple[Type[T], ...]] = None
         self._number_of_times_fetched = 0
         self._number_of_failed_fetch = 0
 
@@ -64,13 +51,11 @@ class Wreck(BaseModel):
         return self.number_of_failed_fetch / self.number_of_times_fetched
 
     def add_item(self, item_class: Type[T], quantity: int):
-        self._item_sets.append(_ItemSet(item_class, quantity))
+        self._quantities[item_class] = self._quantities.get(item_class, 0) + quantity
+        self._item_classes = None
 
     def _amount(self, item_class: Type[T]) -> int:
-        for item_set in self._item_sets:
-            if item_set.item_class is item_class:
-                return item_set.quantity
-        return 0
+        return self._quantities.get(item_class, 0)
 
     def search(self, player: Player) -> Union[None, T]:
         """Search the wreck
@@ -80,24 +65,64 @@ class Wreck(BaseModel):
         """
         self._number_of_times_fetched += 1
 
-        if random.random() < self._probability and len(self._item_sets) > 0:
-            item_set_found: _ItemSet = random.choice(self._item_sets)
-            if player.has_item(item_set_found.item_class):
-                return self.search(player)
-            try:
-                item = item_set_found.take_item()
-            except _ItemSetEmpty:
-                # This case shouldn't happen if every item set is filled at the dawn of times
-                self._item_sets.remove(item_set_found)
-                self._number_of_failed_fetch += 1
+        draw = self._rng.random()
+        if draw >= self._probability or not self._quantities:
+            self._number_of_failed_fetch += 1
+            return None
+
+        if self._item_classes is None:
+            self._item_classes = tuple(self._quantities)
+        item_classes = self._item_classes
+        item_class = item_classes[
+            min(
+                int(draw / self._probability * len(item_classes)), len(item_classes) - 1
+            )
+        ]
+        if player.has_item(item_class):
+            item_class = self._search_again(player, item_classes)
+            if item_class is None:
                 return None
 
-            if item_set_found.is_empty:
-                self._item_sets.remove(item_set_found)
-            return item
+        quantity = self._quantities[item_class] - 1
+        if quantity <= 0:
+            del self._quantities[item_class]
+            self._item_classes = None
+        else:
+            self._quantities[item_class] = quantity
+
+        if quantity < 0:
+            # Only happens to the sets added empty
+            self._number_of_failed_fetch += 1
+            return None
+        return item_class()
+
+    def _search_again(self, player: Player, item_classes: Tuple[Type[T], ...]):
+        """
+        The player found a set whose object is already owned and searches again, as many times as needed.
+        The amount of searches follows a geometric distribution and is drawn at once,
+        then their outcome is drawn knowing they ended, among the sets not owned.
+        :return: The set found, None if nothing was found
+        """
+        candidates = [c for c in item_classes if not player.has_item(c)]
+
+        # Odds of a search finding each set, then finding any set already owned
+        odds = self._probability / len(item_classes)
+        retry = odds * (len(item_classes) - len(candidates))
+        if retry >= 1:
+            # Every object is owned and always found, the player gives up
+            self._number_of_failed_fetch += 1
+            return None
+
+        self._number_of_times_fetched += 1 + int(
+            math.log(1 - self._rng.random()) / math.log(retry)
+        )
+        odds /= 1 - retry
 
-        self._number_of_failed_fetch += 1
-        return None
+        draw = self._rng.random()
+        if draw >= odds * len(candidates):
+            self._number_of_failed_fetch += 1
+            return None
+        return candidates[min(int(draw / odds), len(candidates) - 1)]
 
     def summarize(self) -> WreckSum:
         return WreckSum(